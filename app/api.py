@@ -0,0 +1,284 @@
+# api.py — headless HTTP API for scans, ordinances and PDF reports
+#
+#   python app/api.py --port 8080 --workers 8
+#
+#   GET  /healthz                 liveness, breaker state, cache and queue stats
+#   GET  /cities                  cities with an ordinance
+#   GET  /ordinance?city=Denver   full ordinance text
+#   GET  /metrics[?format=json]   per-stage latency quantiles and counters (Prometheus text)
+#   POST /scan                    {"listing", "city" | "ordinance" | "cities": [...],
+#                                  "model"?, "use_cache"?}
+#   POST /pdf                     {"listing", "result", "city"?} -> application/pdf
+#
+# Connections are served by cheap per-connection threads; scans and PDF
+# renders run in a fixed worker pool. Once every worker is busy and the
+# queue is full, new work is refused at once with 503 + Retry-After instead
+# of piling up. Work that outlives the request timeout is answered with
+# 504; it keeps running and its result lands in the scan cache, so a retry
+# is usually a cache hit.
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from utils.db import NO_ORDINANCE, get_ordinance, get_ordinance_context, get_ordinance_contexts, list_cities
+from utils import metrics
+from utils.health import health_snapshot
+from utils.llm import analyze_listing, analyze_multi, cache_stats
+from utils.pdf import render_pdf_bytes
+from utils.ratelimit import limiter_stats
+
+API_WORKERS = int(os.getenv("API_WORKERS", 8))
+# Requests admitted beyond the busy workers before answering 503.
+API_QUEUE_SIZE = int(os.getenv("API_QUEUE_SIZE", 32))
+API_REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", 90))
+# Slow or stalled clients are dropped after this many seconds of socket inactivity.
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", 15))
+API_MAX_BODY = int(os.getenv("API_MAX_BODY", 1024 * 1024))
+# Pending connections the kernel holds before refusing them (the default
+# of 5 drops bursts long before the worker queue could answer 503).
+API_BACKLOG = int(os.getenv("API_BACKLOG", 1024))
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class WorkerPool:
+    """Fixed thread pool with a bounded queue; full means 503, not waiting."""
+
+    def __init__(self, workers: int = API_WORKERS, queue_size: int = API_QUEUE_SIZE):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self._lock = threading.Lock()
+        self._stats = {"admitted": 0, "rejected": 0, "timed_out": 0, "in_flight": 0}
+
+    def run(self, fn: Callable[..., Any], *args: Any, timeout: float = API_REQUEST_TIMEOUT) -> Any:
+        with self._lock:
+            if self._stats["in_flight"] >= self.capacity:
+                self._stats["rejected"] += 1
+                raise ApiError(503, "server busy, retry shortly")
+            self._stats["in_flight"] += 1
+            self._stats["admitted"] += 1
+        fut = self._pool.submit(fn, *args)
+        fut.add_done_callback(self._release)
+        try:
+            return fut.result(timeout=timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._stats["timed_out"] += 1
+            raise ApiError(504, f"request timed out after {timeout:.0f}s")
+
+    def _release(self, _) -> None:
+        with self._lock:
+            self._stats["in_flight"] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, workers=self.workers, capacity=self.capacity)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+###########################################
+# ENDPOINTS
+###########################################
+def _optional(body: Dict[str, Any], name: str, kind: Any, description: str) -> Any:
+    """body[name] if present and of `kind`; missing/null is None; anything else is a 400."""
+    value = body.get(name)
+    if value is not None and not isinstance(value, kind):
+        raise ApiError(400, f"'{name}' must be {description}")
+    return value
+
+
+def _string_list(body: Dict[str, Any], name: str) -> List[str]:
+    value = _optional(body, name, list, "a list of strings")
+    if value is None:
+        return []
+    if not all(isinstance(item, str) for item in value):
+        raise ApiError(400, f"'{name}' must be a list of strings")
+    return value
+
+
+def handle_scan(body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+    listing = _optional(body, "listing", str, "a string")
+    if not listing or not listing.strip():
+        raise ApiError(400, "'listing' is required")
+    model = _optional(body, "model", str, "a model id string")
+    use_cache = _optional(body, "use_cache", bool, "true or false")
+    use_cache = True if use_cache is None else use_cache
+    cities = [c for c in _string_list(body, "cities") if c.strip()]
+    ordinance = _optional(body, "ordinance", str, "a string")
+    city = _optional(body, "city", str, "a string")
+
+    if cities:
+        ordinances = get_ordinance_contexts(cities, listing)
+        missing = [c for c in cities if c not in ordinances]
+        if missing:
+            raise ApiError(404, f"no ordinance for: {', '.join(missing)}")
+        results = analyze_multi(listing, ordinances, model=model, use_cache=use_cache)
+        return 200, {"results": results}
+
+    if not (ordinance and ordinance.strip()):
+        if not city:
+            raise ApiError(400, "one of 'city', 'cities' or 'ordinance' is required")
+        ordinance = get_ordinance_context(city, listing)
+        if ordinance == NO_ORDINANCE:
+            raise ApiError(404, f"no ordinance for: {city}")
+
+    result = analyze_listing(listing, ordinance, model=model, use_cache=use_cache)
+    # Upstream failures still carry the EMPTY_RESULT shape; flag them with 502.
+    return (502 if "error" in result else 200), result
+
+
+def handle_pdf(body: Dict[str, Any]) -> bytes:
+    listing = _optional(body, "listing", str, "a string")
+    result = _optional(body, "result", dict, "a scan result object")
+    if listing is None or result is None:
+        raise ApiError(400, "'listing' and 'result' are required")
+    city = _optional(body, "city", str, "a string")
+    fixed = _optional(result, "fixed_listing", str, "a string")
+    # Phrases may be plain strings or {"phrase": ...} objects, as the model returns them.
+    risky = _optional(result, "risky_phrases", list, "a list") or []
+    citations = _optional(result, "citations", list, "a list") or []
+    return render_pdf_bytes(
+        listing,
+        fixed or "",
+        [str(p) for p in risky],
+        [str(c) for c in citations],
+        city,
+    )
+
+
+def handle_ordinance(query: Dict[str, str]) -> Dict[str, Any]:
+    city = query.get("city")
+    if not city:
+        raise ApiError(400, "'city' query parameter is required")
+    text = get_ordinance(city)
+    if text == NO_ORDINANCE:
+        raise ApiError(404, f"no ordinance for: {city}")
+    return {"city": city, "text": text}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "PetClauseAPI/1.0"
+    protocol_version = "HTTP/1.1"
+    timeout = API_READ_TIMEOUT
+    pool: WorkerPool  # set by serve()
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        sys.stderr.write(f"[api] {self.address_string()} {fmt % args}\n")
+
+    def _send(self, status: int, data: bytes, content_type: str, extra: Dict[str, str] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (extra or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _json(self, status: int, payload: Any, extra: Dict[str, str] = None) -> None:
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                   "application/json; charset=utf-8", extra)
+
+    def _body(self) -> Dict[str, Any]:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            raise ApiError(400, "invalid Content-Length")
+        if length > API_MAX_BODY:
+            raise ApiError(413, f"body larger than {API_MAX_BODY} bytes")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise ApiError(400, "body must be JSON")
+        if not isinstance(body, dict):
+            raise ApiError(400, "body must be a JSON object")
+        return body
+
+    def _dispatch(self, method: str) -> None:
+        url = urlparse(self.path)
+        try:
+            if method == "GET" and url.path == "/healthz":
+                # Answered inline so it still works when the pool is saturated.
+                self._json(200, {"status": "ok", "queue": self.pool.stats(), "models": health_snapshot(),
+                                 "cache": cache_stats(), "rate_limits": limiter_stats()})
+            elif method == "GET" and url.path == "/metrics":
+                if parse_qs(url.query).get("format") == ["json"]:
+                    self._json(200, metrics.snapshot())
+                else:
+                    self._send(200, metrics.prometheus_text().encode("utf-8"),
+                               "text/plain; version=0.0.4; charset=utf-8")
+            elif method == "GET" and url.path == "/cities":
+                self._json(200, {"cities": list_cities()})
+            elif method == "GET" and url.path == "/ordinance":
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                self._json(200, handle_ordinance(query))
+            elif method == "POST" and url.path == "/scan":
+                status, payload = self.pool.run(handle_scan, self._body())
+                self._json(status, payload)
+            elif method == "POST" and url.path == "/pdf":
+                data = self.pool.run(handle_pdf, self._body())
+                self._send(200, data, "application/pdf")
+            else:
+                raise ApiError(404, f"no route for {method} {url.path}")
+        except ApiError as e:
+            if method == "POST":
+                # The body may not have been read; don't reuse the connection.
+                self.close_connection = True
+            extra = {"Retry-After": "1"} if e.status == 503 else None
+            self._json(e.status, {"error": e.message}, extra)
+        except Exception as e:
+            self.log_error("unhandled error: %r", e)
+            self._json(500, {"error": "internal_error"})
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+
+def serve(host: str, port: int, workers: int = API_WORKERS, queue_size: int = API_QUEUE_SIZE) -> ThreadingHTTPServer:
+    """Build the server (call serve_forever() on it)."""
+    handler = type("BoundApiHandler", (ApiHandler,), {"pool": WorkerPool(workers, queue_size)})
+    server_cls = type("ApiServer", (ThreadingHTTPServer,),
+                      {"request_queue_size": API_BACKLOG, "daemon_threads": True})
+    return server_cls((host, port), handler)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Headless HTTP API for PetClause AI scans.")
+    parser.add_argument("--host", default=os.getenv("API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", 8080)))
+    parser.add_argument("-w", "--workers", type=int, default=API_WORKERS, help="scan/PDF worker threads")
+    parser.add_argument("--queue-size", type=int, default=API_QUEUE_SIZE,
+                        help="requests admitted beyond busy workers before answering 503")
+    args = parser.parse_args(argv)
+
+    server = serve(args.host, args.port, args.workers, args.queue_size)
+    print(f"[api] listening on http://{args.host}:{args.port} "
+          f"({args.workers} workers, queue {args.queue_size})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.RequestHandlerClass.pool.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,13 @@
 # app.py — UPDATED WITH LOGO + FIXED WARNING CSS (Dec 2025)
-import os
 import streamlit as st
 import uuid
 import urllib.parse
-from utils.db import get_ordinance
-from utils.llm import analyze_listing
-from utils.pdf import create_pdf
+from utils.db import NO_ORDINANCE, get_ordinance_context, get_ordinance_contexts, list_cities
+from utils.llm import analyze_listing_stream, analyze_multi, phrase_matrix
+from utils.pdf import render_pdf_bytes
+from utils.pdf_extract import PdfRejected, extract_text
+from utils import profiling
+from utils.rules import prescan
 
 st.markdown("""
 <script>
@@ -183,11 +185,20 @@ if "last_listing" not in st.session_state:
     st.session_state.last_listing = ""
 if "current_city" not in st.session_state:
     st.session_state.current_city = "Denver"
+if "multi_result" not in st.session_state:
+    st.session_state.multi_result = None
 if "order_identifier" not in st.session_state: # <-- Add a check for the order ID state
     st.session_state.order_identifier = None
+if "upload" not in st.session_state:
+    st.session_state.upload = None
 
 query_params = st.query_params
 
+# Operators can profile their own session's scans with ?profile=<PROFILE_TOKEN>.
+if profiling.token_ok(query_params.get("profile")):
+    st.session_state.profile = True
+profile_session = st.session_state.get("profile", False)
+
 if query_params.get("paid") == "1" and query_params.get("order"):
     # 1. Set flags in session state (this is what persists the access)
     st.session_state.paid = True
@@ -360,27 +371,88 @@ listing = st.text_area(
     placeholder="Example: No aggressive breeds • $500 pet deposit • No dogs over 40 lbs..."
 )
 
-city = st.selectbox("Select city:", [
-    "Denver", "Austin", "Seattle", "Portland", "Atlanta",
-    "Chicago", "Boston", "Berlin", "Miami", "San Francisco"
-], index=0)
+uploaded = st.file_uploader("…or upload the lease / listing as a PDF:", type=["pdf"])
+if uploaded is not None:
+    # Extracted once per file; reruns reuse the text instead of re-parsing.
+    if st.session_state.upload is None or st.session_state.upload["file_id"] != uploaded.file_id:
+        progress = st.progress(0.0, text="Reading PDF…")
+        try:
+            extracted = extract_text(
+                uploaded,
+                on_page=lambda done, count: progress.progress(done / count, text=f"Reading page {done} of {count}…"),
+            )
+        except PdfRejected as e:
+            extracted = {"error": str(e)}
+        progress.empty()
+        st.session_state.upload = {"file_id": uploaded.file_id, **extracted}
+
+    upload = st.session_state.upload
+    if "error" in upload:
+        st.error(upload["error"])
+    elif not upload["text"].strip():
+        st.warning("No text found in this PDF (is it a scanned image?). Paste the text above instead.")
+    else:
+        listing = upload["text"]
+        note = f"Scanning the text of {uploaded.name} ({upload['pages']} pages) instead of the box above."
+        if upload["truncated"]:
+            note += f" Only the first {upload['pages']} of {upload['total_pages']} pages are included."
+        st.info(note)
+
+cities = list_cities()
+city = st.selectbox(
+    "Select city:",
+    cities,
+    index=cities.index(st.session_state.current_city) if st.session_state.current_city in cities else 0
+)
+
+compare_mode = st.checkbox("Compare this listing across several cities")
+if compare_mode:
+    compare_cities = st.multiselect("Cities to compare:", cities, default=[city])
 
 scan_button = st.button("🚀 Scan for Pet Clause Compliance", type="primary", use_container_width=True)
 
 
+# ====================== RUN MULTI-CITY ANALYSIS ======================
+if scan_button and compare_mode:
+    if not listing.strip():
+        st.error("Please paste your listing first.")
+        st.stop()
+
+    ordinances = get_ordinance_contexts(compare_cities, listing)
+    if not ordinances:
+        st.error("Pick at least one city to compare.")
+        st.stop()
+
+    with st.spinner(f"AI checking against {len(ordinances)} jurisdictions at once…"), profiling.forced(profile_session):
+        st.session_state.multi_result = analyze_multi(listing, ordinances)
+        st.session_state.last_listing = listing
+    st.rerun()
+
 # ====================== RUN ANALYSIS ======================
 if scan_button:
     if not listing.strip():
         st.error("Please paste your listing first.")
         st.stop()
 
-    ordinance = get_ordinance(city)
-    if not ordinance:
+    ordinance = get_ordinance_context(city, listing)
+    if not ordinance or ordinance == NO_ORDINANCE:
         st.error(f"Ordinance for {city} coming soon! Check back in 24h.")
         st.stop()
 
-    with st.spinner("AI checking against local + federal law…"):
-        result = analyze_listing(listing, ordinance)
+    # Mechanical rule hits are instant; show them before the model answers.
+    for finding in prescan(listing, ordinance)["findings"]:
+        st.error(f"{finding['phrase']} — {finding['reason']}")
+
+    # Warnings are shown as soon as the model finishes each one; the full
+    # results view replaces them on the rerun below.
+    live_warnings = st.container()
+
+    with st.spinner("AI checking against local + federal law…"), profiling.forced(profile_session):
+        result = analyze_listing_stream(
+            listing,
+            ordinance,
+            on_phrase=lambda phrase: live_warnings.warning(phrase)
+        )
         st.session_state.result = result
         st.session_state.scan_completed = True
         st.session_state.last_listing = listing
@@ -388,6 +460,25 @@ if scan_button:
         # st.session_state.paid = False  
     st.rerun()
 
+# ====================== SHOW MULTI-CITY MATRIX ======================
+if compare_mode and st.session_state.multi_result:
+    multi = st.session_state.multi_result
+    st.markdown("<div class='section-title'>Risky Phrases by City</div>", unsafe_allow_html=True)
+
+    rows = phrase_matrix(multi)
+    if rows:
+        st.dataframe(
+            [{"Phrase": row["phrase"], **{c: "⚠️" if row[c] else "" for c in multi}} for row in rows],
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        st.success("No major violations detected in any selected city!")
+
+    for c, res in multi.items():
+        if "error" in res:
+            st.error(f"{c}: {res['error']}")
+
 # ====================== SHOW RESULTS ======================
 if st.session_state.scan_completed and st.session_state.result:
     r = st.session_state.result
@@ -439,8 +530,19 @@ if st.session_state.scan_completed and st.session_state.result:
         st.markdown(html_score, unsafe_allow_html=True)
     with col2:
         st.markdown(html_risks, unsafe_allow_html=True)
+    # INSTANT RULE CHECKS
+    rule_findings = r.get("_meta", {}).get("prescan", {}).get("findings", [])
+    if rule_findings:
+        st.markdown("<div class='section-title'>Instant Rule Checks</div>", unsafe_allow_html=True)
+        for finding in rule_findings:
+            st.error(f"{finding['phrase']} — {finding['reason']}")
+
     # RISKY PHRASES
     st.markdown("<div class='section-title'>Risky / Illegal Phrases</div>", unsafe_allow_html=True)
+    sent = r.get("_meta", {}).get("relevance", {})
+    if sent.get("filtered"):
+        st.caption(f"Long listing: only its pet-related passages were analyzed "
+                   f"(~{sent['sent_tokens']} of {sent['original_tokens']} tokens).")
     if r.get("risky_phrases"):
         for phrase in r["risky_phrases"]:
             st.warning(phrase)
@@ -521,30 +623,24 @@ if st.session_state.scan_completed and st.session_state.result:
 
         # PDF
         st.markdown("#### Download Your Court-Ready Report")
-        os.makedirs("reports", exist_ok=True)
-        pdf_path = f"reports/report_{uuid.uuid4().hex[:8]}.pdf"
-        # print("[TEST] PDF generated:", pdf_path)  # console log
-
-        create_pdf(
-            pdf_path,
-            st.session_state.last_listing,
-            r["fixed_listing"],
-            r.get("risky_phrases", []),
-            r.get("citations", []),
-            city=st.session_state.current_city
-        )
-
-
-        with open(pdf_path, "rb") as f:
-            st.download_button(
-                "Download Full PDF Report",
-                f,
-                file_name=f"PetClause_Report_{st.session_state.current_city}_{uuid.uuid4().hex[:6]}.pdf",
-                mime="application/pdf",
-                type="primary",
-                use_container_width=True
+        with profiling.forced(profile_session):
+            pdf_bytes = render_pdf_bytes(
+                st.session_state.last_listing,
+                r["fixed_listing"],
+                r.get("risky_phrases", []),
+                r.get("citations", []),
+                city=st.session_state.current_city
             )
 
+        st.download_button(
+            "Download Full PDF Report",
+            pdf_bytes,
+            file_name=f"PetClause_Report_{st.session_state.current_city}.pdf",
+            mime="application/pdf",
+            type="primary",
+            use_container_width=True
+        )
+
         st.success("You now have a fully compliant, court-defendable pet policy!")
 
     # SHARE
@@ -0,0 +1,182 @@
+# batch.py — bulk portfolio scanning from the command line
+#
+#   python app/batch.py listings.csv -o results.jsonl --workers 8
+#
+# Input is CSV (header row) or JSONL with a `listing` (or `text`) field, an
+# optional `city` field and an optional `id` field. Results are appended to
+# the output JSONL as they complete; the output doubles as the checkpoint,
+# so re-running the same command skips every id already scanned successfully
+# and retries the ones that failed.
+import argparse
+import csv
+import json
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Set
+
+from utils import metrics
+from utils.db import NO_ORDINANCE, get_ordinance, get_ordinance_context
+from utils.llm import analyze_listing
+from utils.pdf_service import get_service, make_job
+
+
+def iter_rows(path: Path, default_city: Optional[str]) -> Iterator[Dict[str, str]]:
+    """Stream rows from CSV or JSONL without loading the file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for n, row in enumerate(rows, start=1):
+            yield {
+                "id": str(row.get("id") or f"row-{n}"),
+                "listing": row.get("listing") or row.get("text") or "",
+                "city": row.get("city") or default_city or "",
+            }
+
+
+def load_checkpoint(path: Path) -> Set[str]:
+    """Ids already scanned successfully according to the output file."""
+    done: Set[str] = set()
+    if not path.exists():
+        return done
+    with open(path, "rb+") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn write from a crash
+            if isinstance(record, dict) and "id" in record and "error" not in record:
+                done.add(record["id"])
+        # Make sure the next record starts on its own line.
+        if f.tell() > 0:
+            f.seek(-1, 2)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    return done
+
+
+class OrdinanceResolver:
+    """Looks each city up once per run."""
+
+    def __init__(self):
+        self._cache: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, city: str) -> Optional[str]:
+        with self._lock:
+            if city not in self._cache:
+                text = get_ordinance(city) if city else NO_ORDINANCE
+                self._cache[city] = None if text == NO_ORDINANCE else text
+            return self._cache[city]
+
+
+def scan_row(row: Dict[str, str], resolver: OrdinanceResolver, model: Optional[str],
+             use_cache: bool) -> Dict:
+    if not row["listing"].strip():
+        return {"id": row["id"], "city": row["city"], "error": "empty_listing"}
+    if resolver.get(row["city"]) is None:
+        return {"id": row["id"], "city": row["city"], "error": "no_ordinance_for_city"}
+    # Long ordinances are cut down to the sections relevant to this listing.
+    ordinance = get_ordinance_context(row["city"], row["listing"])
+    result = analyze_listing(row["listing"], ordinance, model=model, use_cache=use_cache)
+    record = {"id": row["id"], "city": row["city"], "listing": row["listing"], "result": result}
+    if "error" in result:
+        record["error"] = result["error"]
+    return record
+
+
+def build_portfolio(results_path: Path, pdf_path: Path) -> int:
+    """Merge a report for every successful record into one PDF, rendered across processes."""
+    count = 0
+
+    def jobs() -> Iterator[Dict]:
+        nonlocal count
+        with open(results_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if "error" in record or "result" not in record:
+                    continue
+                count += 1
+                yield make_job(record.get("listing", ""), record["result"], record.get("city"))
+
+    data = get_service().render_portfolio(jobs())
+    pdf_path.write_bytes(data)
+    return count
+
+
+def run(args: argparse.Namespace) -> int:
+    output = Path(args.output)
+    done = load_checkpoint(output)
+    resolver = OrdinanceResolver()
+    stats = {"skipped": 0, "ok": 0, "failed": 0}
+    started = time.time()
+
+    rows = iter_rows(Path(args.input), args.city)
+    max_in_flight = args.workers * 2
+
+    with open(output, "a", encoding="utf-8") as out, ThreadPoolExecutor(args.workers) as pool:
+        pending = set()
+
+        def drain(block_until_below: int) -> None:
+            nonlocal pending
+            while len(pending) > block_until_below:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    record = fut.result()
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    stats["failed" if "error" in record else "ok"] += 1
+                    total = stats["ok"] + stats["failed"]
+                    if total % args.progress_every == 0:
+                        rate = total / max(time.time() - started, 1e-9)
+                        print(f"[batch] {total} scanned ({rate:.1f}/s), "
+                              f"{stats['failed']} failed, {stats['skipped']} skipped", file=sys.stderr)
+
+        for n, row in enumerate(rows):
+            if args.limit and n >= args.limit:
+                break
+            if row["id"] in done:
+                stats["skipped"] += 1
+                continue
+            done.add(row["id"])
+            pending.add(pool.submit(scan_row, row, resolver, args.model, not args.no_cache))
+            drain(max_in_flight - 1)
+        drain(0)
+
+    print(f"[batch] finished: {stats['ok']} ok, {stats['failed']} failed, "
+          f"{stats['skipped']} skipped (already in {output}) in {time.time() - started:.1f}s",
+          file=sys.stderr)
+
+    if args.portfolio:
+        n = build_portfolio(output, Path(args.portfolio))
+        print(f"[batch] portfolio report with {n} scan(s) written to {args.portfolio}", file=sys.stderr)
+    if args.metrics:
+        metrics.dump(args.metrics)
+        print(f"[batch] stage timings and counters written to {args.metrics}", file=sys.stderr)
+    return 0 if stats["failed"] == 0 else 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Scan a portfolio of listings for pet-clause compliance.")
+    parser.add_argument("input", help="CSV or JSONL file with listing/city/id columns")
+    parser.add_argument("-o", "--output", required=True, help="results JSONL (also the resume checkpoint)")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="parallel scans (default: 4)")
+    parser.add_argument("--city", help="city to use for rows without one")
+    parser.add_argument("--model", help="override the primary model")
+    parser.add_argument("--limit", type=int, default=0, help="stop after N input rows")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the scan result cache")
+    parser.add_argument("--portfolio", help="also write one merged PDF report for all successful scans")
+    parser.add_argument("--metrics", help="write per-stage timings and counters (JSON) here at the end")
+    parser.add_argument("--progress-every", type=int, default=100, help="progress line every N scans")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+# tests/conftest.py — run from the repo root or app/: `python -m pytest app/tests`
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
@@ -0,0 +1,41 @@
+# tests/test_api.py
+import pytest
+
+import api
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"city": "Austin"}, "'listing' is required"),
+    ({"listing": 5, "city": "Austin"}, "'listing' must be a string"),
+    ({"listing": "No dogs", "cities": "Austin"}, "'cities' must be a list of strings"),
+    ({"listing": "No dogs", "cities": ["Austin", 3]}, "'cities' must be a list of strings"),
+    ({"listing": "No dogs", "city": ["Austin"]}, "'city' must be a string"),
+    ({"listing": "No dogs", "ordinance": {"text": "x"}}, "'ordinance' must be a string"),
+    ({"listing": "No dogs", "city": "Austin", "model": 1}, "'model' must be a model id string"),
+    ({"listing": "No dogs", "city": "Austin", "use_cache": "no"}, "'use_cache' must be true or false"),
+    ({"listing": "No dogs"}, "one of 'city', 'cities' or 'ordinance' is required"),
+])
+def test_scan_rejects_bad_fields(body, message):
+    with pytest.raises(api.ApiError) as err:
+        api.handle_scan(body)
+    assert (err.value.status, err.value.message) == (400, message)
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"listing": "x"}, "'listing' and 'result' are required"),
+    ({"listing": "x", "result": []}, "'result' must be a scan result object"),
+    ({"listing": "x", "result": {"risky_phrases": "No dogs"}}, "'risky_phrases' must be a list"),
+    ({"listing": "x", "result": {"citations": "Sec. 1"}}, "'citations' must be a list"),
+    ({"listing": "x", "result": {"fixed_listing": ["y"]}}, "'fixed_listing' must be a string"),
+    ({"listing": "x", "result": {}, "city": ["Austin"]}, "'city' must be a string"),
+])
+def test_pdf_rejects_bad_fields(body, message):
+    with pytest.raises(api.ApiError) as err:
+        api.handle_pdf(body)
+    assert (err.value.status, err.value.message) == (400, message)
+
+
+def test_pdf_renders_a_valid_result():
+    data = api.handle_pdf({"listing": "No dogs.", "city": "Austin",
+                           "result": {"fixed_listing": "Dogs welcome.", "risky_phrases": ["No dogs"]}})
+    assert data.startswith(b"%PDF")
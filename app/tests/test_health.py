@@ -0,0 +1,79 @@
+# tests/test_health.py
+import pytest
+
+from utils import health
+from utils.health import CLOSED, HALF_OPEN, OPEN, ModelHealth, is_failure_status
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    monkeypatch.setattr(health, "MIN_REQUESTS", 4)
+    monkeypatch.setattr(health, "ERROR_THRESHOLD", 0.5)
+    monkeypatch.setattr(health, "COOLDOWN_SECONDS", 0)
+    return ModelHealth("test/model")
+
+
+def _trip(breaker):
+    for ok in (True, False, True, False):
+        breaker.record(ok)
+    assert breaker.state == OPEN
+
+
+def test_opens_at_threshold_after_min_requests(breaker):
+    for _ in range(3):
+        breaker.record(False)
+    assert breaker.state == CLOSED  # not enough calls yet
+    breaker.record(True)
+    assert breaker.state == OPEN
+
+
+def test_open_breaker_waits_out_the_cooldown(breaker, monkeypatch):
+    monkeypatch.setattr(health, "COOLDOWN_SECONDS", 3600)
+    _trip(breaker)
+    assert not breaker.available()
+    assert not breaker.allow()
+
+
+def test_half_open_lets_one_probe_through(breaker):
+    _trip(breaker)
+    assert breaker.available()
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.available()
+    assert not breaker.allow()
+
+
+def test_probe_outcome_closes_or_reopens(breaker):
+    _trip(breaker)
+    breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["calls_in_window"] == 0
+
+
+def test_released_probe_can_be_claimed_again(breaker):
+    _trip(breaker)
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_adaptive_timeout(breaker, monkeypatch):
+    assert breaker.timeout(30) == 30  # too few samples
+    for i in range(100):
+        breaker.record(True, latency=3.0 + i / 100)
+    assert breaker.latency_percentile(0.5) == pytest.approx(3.5, abs=0.02)
+    assert breaker.timeout(30) == pytest.approx(3.99 * health.TIMEOUT_MULTIPLIER, abs=0.05)
+    assert breaker.timeout(4) == 4
+    monkeypatch.setattr(health, "TIMEOUT_MIN", 10)
+    assert breaker.timeout(30) == 10
+    assert breaker.timeout(4) == 4  # the ceiling wins over the floor
+
+
+def test_failure_statuses():
+    assert is_failure_status(None) and is_failure_status(503) and is_failure_status(408)
+    assert not is_failure_status(429) and not is_failure_status(400)
@@ -0,0 +1,42 @@
+# tests/test_jsonrepair.py
+from utils.jsonrepair import repair_json, repair_json_checked
+
+
+def test_valid_json_is_unchanged():
+    assert repair_json_checked('{"a": 1, "b": [true, null]}') == ({"a": 1, "b": [True, None]}, False)
+
+
+def test_fences_prose_and_trailing_commas():
+    text = 'Sure! Here it is:\n```json\n{"risky_phrases": ["No dogs",], "confidence": 80,}\n```\nThanks'
+    assert repair_json_checked(text) == ({"risky_phrases": ["No dogs"], "confidence": 80}, False)
+
+
+def test_python_literals_single_quotes_and_bare_keys():
+    assert repair_json("{confidence: 70, 'ok': True, 'x': None}") == {"confidence": 70, "ok": True, "x": None}
+
+
+def test_unescaped_quote_inside_string():
+    assert repair_json('{"fixed_listing": "The "cozy" loft"}') == {"fixed_listing": 'The "cozy" loft'}
+
+
+def test_open_string_is_closed_and_reported():
+    parsed, truncated = repair_json_checked('{"risky_phrases": ["No pets"], "fixed_listing": "The building has a')
+    assert parsed == {"risky_phrases": ["No pets"], "fixed_listing": "The building has a"}
+    assert truncated
+
+
+def test_open_container_is_closed_and_reported():
+    parsed, truncated = repair_json_checked('{"risky_phrases": ["No pets", "Pet fee $500"')
+    assert parsed == {"risky_phrases": ["No pets", "Pet fee $500"]}
+    assert truncated
+
+
+def test_partial_number_and_dangling_key_are_dropped():
+    assert repair_json_checked('{"risky_phrases": [], "confidence": 8') == ({"risky_phrases": []}, True)
+    assert repair_json_checked('{"risky_phrases": [], "notes"') == ({"risky_phrases": []}, True)
+
+
+def test_nothing_usable():
+    assert repair_json_checked("I cannot help with that.") == (None, False)
+    assert repair_json("") is None
+    assert repair_json('["not", "an", "object"]') is None
@@ -0,0 +1,38 @@
+# tests/test_llm_parse.py
+from utils import llm
+
+LISTING = "Sunny 2BR. No pit bulls allowed. Pet fee $500. The building has a gym and laundry."
+
+
+def test_clean_answer_is_used():
+    parsed = llm._safe_load_json('{"risky_phrases": ["No pit bulls"], "fixed_listing": "Sunny 2BR.", '
+                                 '"confidence": 80}')
+    result = llm._finalize(parsed, "", LISTING, "m")
+    assert result["fixed_listing"] == "Sunny 2BR."
+    assert not result["_meta"].get("truncated")
+
+
+def test_answers_without_answer_keys_are_empty():
+    for text in ("", "I refuse. {}", "{}", '{"confidence": 80'):
+        assert llm._needs_enforcer(llm._safe_load_json(text)), text
+
+
+def test_repaired_truncated_answer_keeps_the_listing_and_is_not_cached(monkeypatch):
+    parsed = llm._safe_load_json('{"risky_phrases": ["Pet fee $500"], "fixed_listing": "Sunny 2BR. The building has a')
+    result = llm._finalize(parsed, "", LISTING, "m")
+    assert result["risky_phrases"] == ["Pet fee $500"]
+    assert result["fixed_listing"] == LISTING
+    assert result["notes"] == llm.TRUNCATED_NOTE
+    assert result["_meta"]["truncated"]
+
+    stored = []
+    monkeypatch.setattr(llm._result_cache, "set", lambda key, value: stored.append(key))
+    llm._store_result("k", result)
+    assert stored == []
+
+
+def test_finish_reason_length_marks_even_valid_json_truncated():
+    parsed = llm._safe_load_json('{"risky_phrases": [], "fixed_listing": "Sunny", "confidence": 90}')
+    result = llm._finalize(parsed, "", LISTING, "m", truncated=True)
+    assert result["fixed_listing"] == LISTING
+    assert result["_meta"]["truncated"]
@@ -0,0 +1,57 @@
+# tests/test_ratelimit.py
+import pytest
+
+from utils.ratelimit import RateLimiter, _reset_delay, _retry_after
+
+
+def test_burst_then_one_slot_per_interval():
+    limiter = RateLimiter("t", per_minute=60, burst=2)
+    waits = [limiter.reserve() for _ in range(4)]
+    assert waits[0] == 0 and waits[1] == 0
+    assert waits[2] == pytest.approx(1.0, abs=0.05)
+    assert waits[3] == pytest.approx(2.0, abs=0.05)
+    stats = limiter.stats()
+    assert stats["requests"] == 4 and stats["waited"] == 2 and stats["per_minute"] == 60
+
+
+def test_reserve_rejects_past_max_wait_without_taking_a_slot():
+    limiter = RateLimiter("t", per_minute=60, burst=1)
+    assert limiter.reserve() == 0
+    assert limiter.reserve(max_wait=0.5) is None
+    assert limiter.reserve() == pytest.approx(1.0, abs=0.05)
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_disabled_limiter_only_waits_for_upstream_penalties():
+    limiter = RateLimiter("t", per_minute=0)
+    assert [limiter.reserve() for _ in range(5)] == [0] * 5
+    limiter.penalize(2)
+    assert limiter.reserve() == pytest.approx(2.0, abs=0.05)
+
+
+def test_observe_headers():
+    limiter = RateLimiter("t", per_minute=0)
+    assert limiter.observe({"Retry-After": "3"}) == 3
+    assert limiter.observe({"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "4"}) == 4
+    assert limiter.observe({"X-RateLimit-Remaining": "5", "X-RateLimit-Reset": "4"}) == 0
+    assert limiter.observe({}, status=429) == 1.0
+    assert limiter.stats()["throttled_by_upstream"] == 3
+
+
+def test_header_parsing():
+    assert _retry_after("2.5") == 2.5
+    assert _retry_after("-1") == 0
+    assert _retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert _retry_after("soon") is None
+    assert _reset_delay("30") == 30
+    assert _reset_delay("1000") == 1000
+    assert _reset_delay("1") == 1
+    assert _reset_delay(None) is None
+
+
+def test_sqlite_state_is_shared_between_limiters(tmp_path):
+    path = str(tmp_path / "limits.db")
+    first = RateLimiter("shared", per_minute=60, burst=1, db_path=path)
+    second = RateLimiter("shared", per_minute=60, burst=1, db_path=path)
+    assert first.reserve() == 0
+    assert second.reserve() == pytest.approx(1.0, abs=0.05)
@@ -0,0 +1,64 @@
+# tests/test_relevance.py
+from utils import relevance
+
+FILLER = "The kitchen was renovated last year and has new appliances. "
+PET_PART = "No pit bulls allowed. They must be under 40 lbs. Pet deposit is $500."
+
+
+def _listing(filler_sentences=40):
+    return FILLER * filler_sentences + PET_PART + " " + FILLER * filler_sentences
+
+
+def test_segmenter_keeps_prices_and_weights_together():
+    text = "Rent is $1,200.50 per month. Dogs up to 4.5 lbs ok!\nParking included"
+    spans = relevance.segment_sentences(text)
+    assert [text[s:e] for s, e in spans] == [
+        "Rent is $1,200.50 per month.", "Dogs up to 4.5 lbs ok!", "Parking included"]
+
+
+def test_score_weights():
+    assert relevance.score_sentence("Pets welcome") == 3
+    assert relevance.score_sentence("No rottweilers over 40 lbs") == 4
+    assert relevance.score_sentence("Nonrefundable deposit") == 1
+    assert relevance.score_sentence("Great view of the park") == 0
+
+
+def test_short_listing_is_sent_whole():
+    excerpt = relevance.extract("No dogs. " * 10)
+    assert not excerpt["filtered"]
+    assert excerpt["segments"] == []
+
+
+def test_long_listing_keeps_pet_sentences_and_continuations():
+    text = _listing()
+    excerpt = relevance.extract(text)
+    assert excerpt["filtered"]
+    assert [seg["text"] for seg in excerpt["segments"]] == [PET_PART]
+    assert excerpt["sent_tokens"] < excerpt["original_tokens"]
+
+
+def test_rewrites_are_applied_at_original_offsets():
+    text = _listing()
+    excerpt = relevance.extract(text)
+    edits = relevance.rewrites(excerpt, {"1": " Pets of any breed are welcome. "})
+    fixed = relevance.apply(text, edits)
+    assert fixed == text.replace(PET_PART, "Pets of any breed are welcome.")
+    # List form, keyed by position.
+    assert relevance.rewrites(excerpt, ["Pets welcome."]) == [[edits[0][0], edits[0][1], "Pets welcome."]]
+    assert relevance.rewrites(excerpt, None) == []
+
+
+def test_chunks_cover_every_sent_sentence_once():
+    text = _listing(5) * 8
+    chunks = relevance.chunk_excerpts(text, max_chars=200, overlap_chars=80)
+    assert len(chunks) > 1
+    owned = [(seg["start"], seg["end"]) for c in chunks for seg in c["segments"] if seg["owned"]]
+    assert owned == sorted(owned)
+    assert all(a[1] <= b[0] for a, b in zip(owned, owned[1:]))
+    assert relevance.chunk_excerpts("No dogs.") == []
+
+
+def test_locate_ignores_case_and_whitespace():
+    text = "Sunny loft.  NO   pit bulls allowed."
+    assert relevance.locate(["no pit bulls", "", 42, "cats"], text) == [
+        {"phrase": "no pit bulls", "start": 13, "end": 27}]
@@ -0,0 +1,41 @@
+# tests/test_stream.py
+from utils.stream import RiskyPhraseStream
+
+ANSWER = ('```json\n{"confidence": 80, "risky_phrases": ["No pit bulls", "Pet fee $500", '
+          '{"phrase": "Max 2 \\"small\\" pets"}], "fixed_listing": "[\\"not\\", \\"phrases\\"]"}\n```')
+
+
+def _feed_in(pieces):
+    stream = RiskyPhraseStream()
+    out = []
+    for piece in pieces:
+        out.extend(stream.feed(piece))
+    return stream, out
+
+
+def test_whole_answer_at_once():
+    stream, out = _feed_in([ANSWER])
+    assert out == ["No pit bulls", "Pet fee $500", {"phrase": 'Max 2 "small" pets'}]
+    assert stream.emitted == 3
+
+
+def test_one_character_at_a_time_gives_the_same_phrases():
+    _, out = _feed_in(list(ANSWER))
+    assert out == ["No pit bulls", "Pet fee $500", {"phrase": 'Max 2 "small" pets'}]
+
+
+def test_phrase_is_emitted_as_soon_as_it_closes():
+    stream = RiskyPhraseStream()
+    assert stream.feed('{"risky_phrases": ["No pit') == []
+    assert stream.feed(' bulls", "Pet') == ["No pit bulls"]
+
+
+def test_arrays_under_other_keys_and_nested_keys_are_ignored():
+    _, out = _feed_in(['{"citations": ["Sec. 1"], "meta": {"risky_phrases": ["nested"]}, '
+                       '"risky_phrases": ["top"]}'])
+    assert out == ["top"]
+
+
+def test_nothing_after_the_closing_brace():
+    _, out = _feed_in(['{"risky_phrases": []} {"risky_phrases": ["late"]}'])
+    assert out == []
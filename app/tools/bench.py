@@ -0,0 +1,286 @@
+# tools/bench.py — benchmarks for the scan and report hot paths
+#
+#   cd app && python -m tools.bench                      # run everything, print a table
+#   cd app && python -m tools.bench --save default       # record tools/baselines/default.json
+#   cd app && python -m tools.bench --compare default    # exit 1 on regressions
+#   cd app && python -m tools.bench -k parse -k pdf      # only matching cases
+#
+# Each case is timed in --repeats passes (throughput, p50, p99 per
+# operation; the median pass is what gets saved and compared) and then
+# re-run briefly under tracemalloc for peak Python memory, so the
+# allocation tracing does not distort the timings. Scans run against an
+# in-process tools.openrouter_stub and the DB cases against a temporary
+# copy of the ordinance DB: no network, no key, and the tracked DB is left
+# untouched. Baselines are machine-specific; re-record them on the host
+# you compare on.
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from tools import openrouter_stub
+
+BASELINES_DIR = Path(__file__).resolve().parent / "baselines"
+STUB_MODEL = "stub/bench-model"  # not ":free", so the free-tier rate limiter stays out of the numbers
+
+SHORT_LISTING = ("Cozy 2BR near the park. Pets welcome! No pit bulls or dogs over 40 lbs. "
+                 "Pet fee $500 per pet, non-refundable.")
+LONG_LISTING = " ".join([SHORT_LISTING] * 8)  # 120+ words: create_pdf's page-break path
+ORDINANCE = ("Pet fees must not exceed $300 unless stated otherwise by city regulations. "
+             "Tenants must not be restricted based on animal breed or weight if the animal is a "
+             "service or support animal.")
+
+_CLEAN = json.dumps({"risky_phrases": ["No pit bulls", "Pet fee $500"], "fixed_listing": SHORT_LISTING,
+                     "confidence": 82, "citations": ["Austin pet fee cap"], "notes": "ok"})
+PARSE_INPUTS = {
+    "clean": _CLEAN,
+    "messy": "Sure! Here is the JSON:\n```json\n" + _CLEAN.replace('"', "'").replace("}", ",}") + "\n```\nHope this helps.",
+    "truncated": _CLEAN[: len(_CLEAN) * 2 // 3],
+}
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def measure(fn: Callable[[int], Any], iterations: int, concurrency: int = 1,
+            memory_iterations: Optional[int] = None, repeats: int = 1) -> Dict[str, Any]:
+    """
+    Run fn(i) `iterations` times over `concurrency` threads, `repeats`
+    times; returns the median of each timing stat, plus memory stats.
+    """
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def one(i: int) -> None:
+        t0 = time.perf_counter()
+        fn(i)
+        elapsed = time.perf_counter() - t0
+        with lock:
+            latencies.append(elapsed)
+
+    def run(n: int) -> float:
+        started = time.perf_counter()
+        if concurrency == 1:
+            for i in range(n):
+                one(i)
+        else:
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(one, range(n)))
+        return time.perf_counter() - started
+
+    fn(-1)  # warm-up (imports, lru caches, connections)
+    passes = []
+    for _ in range(max(1, repeats)):
+        latencies.clear()
+        wall = run(iterations)
+        passes.append((iterations / wall, _percentile(latencies, 0.5), _percentile(latencies, 0.99)))
+    stats = {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "repeats": len(passes),
+        "ops_per_sec": round(statistics.median(p[0] for p in passes), 2),
+        "p50_ms": round(statistics.median(p[1] for p in passes) * 1000, 4),
+        "p99_ms": round(statistics.median(p[2] for p in passes) * 1000, 4),
+    }
+
+    tracemalloc.start()
+    try:
+        run(memory_iterations or max(1, min(iterations, 20)))
+        stats["peak_kib"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+    return stats
+
+
+###########################################
+# CASES
+###########################################
+class Bench:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.tmp = tempfile.mkdtemp(prefix="petclause-bench-")
+        self._stub = None
+
+    def close(self) -> None:
+        if self._stub is not None:
+            self._stub.shutdown()
+            self._stub.server_close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _setup_db(self) -> None:
+        from utils import db
+        copy = Path(self.tmp) / "ordinances.db"
+        if db.DB_PATH == copy:
+            return
+        shutil.copy(db.DB_PATH, copy)
+        db.DB_PATH = copy
+        db.invalidate_cache()
+
+    def _setup_llm(self) -> None:
+        from utils import llm
+        if self._stub is None:
+            stub_args = openrouter_stub.build_parser().parse_args(
+                ["--port", "0", "--latency", self.args.stub_latency, "--seed", "0"])
+            self._stub = openrouter_stub.make_server(stub_args)
+            threading.Thread(target=self._stub.serve_forever, daemon=True).start()
+        llm.OPENROUTER_URL = f"http://127.0.0.1:{self._stub.server_address[1]}/api/v1/chat/completions"
+        llm.OPENROUTER_KEY = "bench"
+        llm.HEDGE_ENABLED = False
+
+    def cases(self) -> Dict[str, Callable[[], Dict[str, Any]]]:
+        n = self.args.iterations
+        return {
+            "scan.analyze_listing": self.scan,
+            "parse.clean": lambda: self.parse("clean", n * 20),
+            "parse.messy": lambda: self.parse("messy", n * 20),
+            "parse.truncated": lambda: self.parse("truncated", n * 20),
+            "db.get_ordinance": lambda: self.db("get_ordinance", n * 20),
+            "db.list_cities": lambda: self.db("list_cities", n * 20),
+            "pdf.short": lambda: self.pdf(SHORT_LISTING, max(5, n // 4)),
+            "pdf.long": lambda: self.pdf(LONG_LISTING, max(5, n // 4)),
+        }
+
+    def scan(self) -> Dict[str, Any]:
+        self._setup_llm()
+        from utils import llm
+        run_id = time.time_ns()
+
+        def one(i: int) -> None:
+            # Distinct listings: no result cache hits, no in-flight coalescing.
+            result = llm.analyze_listing(f"{SHORT_LISTING} #{run_id}-{i}", ORDINANCE,
+                                         model=STUB_MODEL, use_cache=False)
+            if "error" in result:
+                raise RuntimeError(result["error"])
+
+        return measure(one, self.args.iterations, self.args.concurrency, repeats=self.args.repeats)
+
+    def parse(self, kind: str, iterations: int) -> Dict[str, Any]:
+        from utils import llm
+        text = PARSE_INPUTS[kind]
+        return measure(lambda i: llm._safe_load_json(text), iterations, memory_iterations=200,
+                       repeats=self.args.repeats)
+
+    def db(self, fn_name: str, iterations: int) -> Dict[str, Any]:
+        self._setup_db()
+        from utils import db
+        fn = getattr(db, fn_name)
+        cities = db.list_cities() or ["Austin"]
+        if fn_name == "get_ordinance":
+            call = lambda i: fn(cities[i % len(cities)])
+        else:
+            call = lambda i: fn()
+        return measure(call, iterations, self.args.concurrency, memory_iterations=200,
+                       repeats=self.args.repeats)
+
+    def pdf(self, listing: str, iterations: int) -> Dict[str, Any]:
+        from utils.pdf import create_pdf
+        risky = ["No pit bulls or dogs over 40 lbs", "Pet fee $500 per pet, non-refundable"]
+        citations = ["Austin: pet fees must not exceed $300"]
+        return measure(lambda i: create_pdf(None, listing, listing, risky, citations, city="Austin"),
+                       iterations, memory_iterations=3, repeats=self.args.repeats)
+
+
+###########################################
+# BASELINES
+###########################################
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerance: float,
+            min_delta_ms: float = 0.0) -> List[str]:
+    """
+    Human-readable regressions beyond `tolerance` (a fraction) against a
+    saved baseline. Latencies (and throughput, as time per operation) must
+    also be worse by more than min_delta_ms: microsecond-scale operations
+    jitter by more than any sane tolerance.
+    """
+    problems = []
+    for name, cur in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        per_op_delta_ms = 1000 / cur["ops_per_sec"] - 1000 / old["ops_per_sec"]
+        if cur["ops_per_sec"] < old["ops_per_sec"] * (1 - tolerance) and per_op_delta_ms > min_delta_ms:
+            problems.append(f"{name}: throughput {cur['ops_per_sec']} < {old['ops_per_sec']} ops/s")
+        for key in ("p50_ms", "p99_ms", "peak_kib"):
+            if not old.get(key) or cur[key] <= old[key] * (1 + tolerance):
+                continue
+            if key.endswith("_ms") and cur[key] - old[key] <= min_delta_ms:
+                continue
+            problems.append(f"{name}: {key} {cur[key]} > {old[key]}")
+    return problems
+
+
+def environment() -> Dict[str, Any]:
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'case':<24} {'iters':>6} {'conc':>5} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'peak KiB':>10}"
+          "  (medians)")
+    for name, r in results.items():
+        print(f"{name:<24} {r['iterations']:>6} {r['concurrency']:>5} {r['ops_per_sec']:>10} "
+              f"{r['p50_ms']:>10} {r['p99_ms']:>10} {r['peak_kib']:>10}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the PetClause scan and report hot paths.")
+    parser.add_argument("-k", "--case", action="append", default=[], help="run cases containing this text")
+    parser.add_argument("-n", "--iterations", type=int, default=40, help="base iteration count per case")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="threads for scan/db cases")
+    parser.add_argument("-r", "--repeats", type=int, default=5, help="timed passes per case; medians are kept")
+    parser.add_argument("--stub-latency", default="fixed:0.05", help="stub latency (see openrouter_stub)")
+    parser.add_argument("--save", metavar="NAME", help="write results to tools/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare against tools/baselines/NAME.json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression (fraction)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.25,
+                        help="ignore regressions smaller than this per operation, whatever the fraction")
+    parser.add_argument("--json", action="store_true", help="print results as JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    bench = Bench(args)
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for name, case in bench.cases().items():
+            if args.case and not any(k in name for k in args.case):
+                continue
+            print(f"[bench] {name} ...", file=sys.stderr)
+            results[name] = case()
+    finally:
+        bench.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+    if args.save:
+        BASELINES_DIR.mkdir(parents=True, exist_ok=True)
+        path = BASELINES_DIR / f"{args.save}.json"
+        path.write_text(json.dumps({"environment": environment(), "results": results}, indent=2) + "\n")
+        print(f"[bench] baseline written to {path}", file=sys.stderr)
+
+    if args.compare:
+        path = BASELINES_DIR / f"{args.compare}.json"
+        baseline = json.loads(path.read_text())
+        problems = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        for p in problems:
+            print(f"[bench] REGRESSION {p}", file=sys.stderr)
+        if problems:
+            return 1
+        print(f"[bench] no regressions against {path.name} (tolerance {args.tolerance:.0%})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+# tools/loadtest.py — concurrent-session load test for app.py
+#
+#   cd app && python -m tools.loadtest --levels 1,2,4,8,16 --stub-latency lognormal:-0.7,0.4
+#   cd app && python -m tools.loadtest --json > loadtest.json
+#
+# Every simulated user is a Streamlit AppTest session running the real
+# app.py script in this process, walking the full funnel:
+#
+#   render   first page load
+#   scan     paste a listing, pick a city, click Scan (streams from the stub)
+#   results  rerun of the results view
+#   paid     return from checkout (?paid=1&order=...), which unlocks the
+#            full view and builds the PDF
+#   rerun    one more interaction on the paid view (PDF served from cache)
+#
+# Concurrency is ramped level by level; each level runs --flows-per-user
+# funnels per concurrent user. The LLM is tools.openrouter_stub in-process,
+# the ordinance DB and scan cache are temporary copies, and listings are
+# unique per flow so neither the result cache nor in-flight coalescing
+# hides the work. The saturation point is the first level whose throughput
+# gain over the previous level drops below --min-gain, or whose flow p99
+# exceeds --p99-slo.
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Must be set before utils.* is imported: the stub has no key-level rate
+# limit (use --stub-rpm to simulate one) and the real scan cache stays clean.
+_TMP = tempfile.mkdtemp(prefix="petclause-loadtest-")
+os.environ.setdefault("OPENROUTER_FREE_RPM", "0")
+os.environ.setdefault("SCAN_CACHE_PATH", os.path.join(_TMP, "scan_cache.db"))
+
+from streamlit.testing.v1 import AppTest, app_test  # noqa: E402
+
+from tools import openrouter_stub  # noqa: E402
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+STEPS = ("render", "scan", "results", "paid", "rerun")
+LISTING = ("Sunny 1BR, pets welcome. No pit bulls or rottweilers. Dogs over 40 lbs not allowed. "
+           "Pet fee $500 per pet, non-refundable.")
+
+
+def _percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 4)
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux /proc; falls back to peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def share_apptest_runtime() -> None:
+    """
+    Let AppTest sessions run concurrently in one process, like real
+    sessions in one Streamlit server.
+
+    AppTest installs a mock Runtime before each run and clears it after,
+    so one session finishing would pull the runtime out from under every
+    other running session; and compiling the script from several threads
+    trips an ast race in CPython 3.11. Both are test-harness artefacts, so
+    all sessions share one mock runtime and script compilation is
+    serialized (and done once).
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    runtime = app_test.MagicMock(spec=Runtime)
+    runtime.media_file_mgr = app_test.MediaFileManager(app_test.MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = app_test.DataframeSourceManager()
+    runtime.cache_storage_manager = app_test.MemoryCacheStorageManager()
+    components = app_test.BidiComponentManager()
+    components.discover_and_register_components(start_file_watching=False)
+    runtime.bidi_component_registry = components
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+
+    compile_lock = threading.Lock()
+    compiled: Dict[str, Any] = {}
+    get_bytecode = ScriptCache.get_bytecode
+
+    def get_bytecode_once(self, script_path: str) -> Any:
+        with compile_lock:
+            if script_path not in compiled:
+                compiled[script_path] = get_bytecode(self, script_path)
+            return compiled[script_path]
+
+    ScriptCache.get_bytecode = get_bytecode_once
+
+
+def setup(args: argparse.Namespace):
+    """Start the stub and point the app's modules at it and at scratch copies."""
+    from utils import db, llm
+
+    share_apptest_runtime()
+
+    stub_argv = ["--port", "0", "--latency", args.stub_latency, "--seed", "0"]
+    if args.stub_rpm:
+        stub_argv += ["--rpm", str(args.stub_rpm)]
+    server = openrouter_stub.make_server(openrouter_stub.build_parser().parse_args(stub_argv))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    llm.OPENROUTER_URL = f"http://127.0.0.1:{server.server_address[1]}/api/v1/chat/completions"
+    llm.OPENROUTER_KEY = "loadtest"
+    copy = Path(_TMP) / "ordinances.db"
+    shutil.copy(db.DB_PATH, copy)
+    db.DB_PATH = copy
+    db.invalidate_cache()
+    return server
+
+
+def run_flow(flow_id: str, city: str, timeout: float, sessions: List[AppTest]) -> Dict[str, Any]:
+    """One user through the whole funnel; returns per-step seconds or an error."""
+    timings: Dict[str, float] = {}
+    at = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+    sessions.append(at)  # kept alive until the level ends, for memory per session
+
+    def step(name: str, action) -> None:
+        t0 = time.perf_counter()
+        action()
+        timings[name] = time.perf_counter() - t0
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].value}")
+
+    def scan() -> None:
+        at.text_area[0].input(f"{LISTING} (unit {flow_id})")
+        at.selectbox[0].select(city)
+        at.button[0].click().run()
+
+    def paid() -> None:
+        at.query_params["paid"] = "1"
+        at.query_params["order"] = f"load-{flow_id}"
+        at.run()
+
+    try:
+        step("render", at.run)
+        step("scan", scan)
+        result = at.session_state.result
+        if not result or "error" in result:
+            raise RuntimeError(f"scan: {(result or {}).get('error', 'no result')}")
+        step("results", at.run)
+        step("paid", paid)
+        if not at.download_button:
+            raise RuntimeError("paid: PDF download not rendered")
+        step("rerun", at.run)
+    except Exception as e:
+        return {"error": str(e), "timings": timings}
+    return {"timings": timings, "total": sum(timings.values())}
+
+
+def run_level(users: int, flows_per_user: int, cities: List[str], timeout: float, level_no: int) -> Dict[str, Any]:
+    sessions: List[AppTest] = []
+    flows = users * flows_per_user
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(users, thread_name_prefix="user") as pool:
+        outcomes = list(pool.map(
+            lambda i: run_flow(f"{level_no}-{i}-{time.time_ns()}", cities[i % len(cities)], timeout, sessions),
+            range(flows)))
+    wall = time.perf_counter() - started
+    rss_after = rss_bytes()
+
+    ok = [o for o in outcomes if "error" not in o]
+    totals = [o["total"] for o in ok]
+    report = {
+        "users": users,
+        "flows": flows,
+        "errors": flows - len(ok),
+        "flows_per_sec": round(len(ok) / wall, 3),
+        "p50": _percentile(totals, 0.5),
+        "p95": _percentile(totals, 0.95),
+        "p99": _percentile(totals, 0.99),
+        "steps": {name: {"p50": _percentile([o["timings"][name] for o in ok], 0.5),
+                         "p99": _percentile([o["timings"][name] for o in ok], 0.99)} for name in STEPS},
+        "rss_mib": round(rss_after / 2 ** 20, 1),
+        "kib_per_session": round(max(0, rss_after - rss_before) / 1024 / max(1, len(sessions)), 1),
+    }
+    errors = [o["error"] for o in outcomes if "error" in o]
+    if errors:
+        report["first_error"] = errors[0]
+    return report
+
+
+def find_saturation(levels: List[Dict[str, Any]], min_gain: float, p99_slo: float) -> Optional[Dict[str, Any]]:
+    for prev, cur in zip([None] + levels, levels):
+        if cur["p99"] is not None and cur["p99"] > p99_slo:
+            return {"users": cur["users"], "reason": f"flow p99 {cur['p99']}s > {p99_slo}s"}
+        if prev and prev["flows_per_sec"] and cur["flows_per_sec"] < prev["flows_per_sec"] * (1 + min_gain):
+            return {"users": prev["users"],
+                    "reason": f"throughput {prev['flows_per_sec']} -> {cur['flows_per_sec']} flows/s "
+                              f"going from {prev['users']} to {cur['users']} users"}
+    return None
+
+
+def print_report(levels: List[Dict[str, Any]], saturation: Optional[Dict[str, Any]]) -> None:
+    print(f"{'users':>5} {'flows':>6} {'err':>4} {'flows/s':>8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} "
+          f"{'scan p99':>9} {'paid p99':>9} {'RSS MiB':>8} {'KiB/sess':>9}")
+    for lv in levels:
+        print(f"{lv['users']:>5} {lv['flows']:>6} {lv['errors']:>4} {lv['flows_per_sec']:>8} "
+              f"{lv['p50'] or '-':>7} {lv['p95'] or '-':>7} {lv['p99'] or '-':>7} "
+              f"{lv['steps']['scan']['p99'] or '-':>9} {lv['steps']['paid']['p99'] or '-':>9} "
+              f"{lv['rss_mib']:>8} {lv['kib_per_session']:>9}")
+    if saturation:
+        print(f"saturation at ~{saturation['users']} concurrent users ({saturation['reason']})")
+    else:
+        print("no saturation within the tested levels")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Ramp concurrent Streamlit sessions through the scan funnel.")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="comma-separated concurrent user counts")
+    parser.add_argument("--flows-per-user", type=int, default=3)
+    parser.add_argument("--cities", default="Austin,Denver,Berlin")
+    parser.add_argument("--stub-latency", default="lognormal:-0.7,0.4", help="see tools.openrouter_stub")
+    parser.add_argument("--stub-rpm", type=int, default=0, help="simulate an upstream requests/minute cap")
+    parser.add_argument("--timeout", type=float, default=120, help="per script run, seconds")
+    parser.add_argument("--min-gain", type=float, default=0.10,
+                        help="throughput gain below which the previous level counts as saturated")
+    parser.add_argument("--p99-slo", type=float, default=10.0, help="flow p99 (s) treated as saturated")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    server = setup(args)
+    cities = [c.strip() for c in args.cities.split(",") if c.strip()]
+    levels: List[Dict[str, Any]] = []
+    try:
+        for n, users in enumerate(int(x) for x in args.levels.split(",")):
+            print(f"[loadtest] {users} concurrent user(s) ...", file=sys.stderr)
+            levels.append(run_level(users, args.flows_per_user, cities, args.timeout, n))
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(_TMP, ignore_errors=True)
+
+    saturation = find_saturation(levels, args.min_gain, args.p99_slo)
+    if args.json:
+        print(json.dumps({"levels": levels, "saturation": saturation}, indent=2))
+    else:
+        print_report(levels, saturation)
+    return 0 if all(lv["errors"] == 0 for lv in levels) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
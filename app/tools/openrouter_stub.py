@@ -0,0 +1,420 @@
+# tools/openrouter_stub.py — OpenRouter-compatible stand-in for offline runs
+#
+#   cd app && python -m tools.openrouter_stub --port 8089 --latency lognormal:0.7,0.4
+#   OPENROUTER_URL=http://127.0.0.1:8089/api/v1/chat/completions OPENROUTER_API_KEY=stub \
+#       streamlit run app.py
+#
+# Answers POST .../chat/completions (plain and "stream": true SSE) in one of
+# three modes:
+#
+#   synth   (default) a deterministic answer built from the prompt with the
+#           local rule pre-scan, so parsing/enforcer/PDF paths see realistic
+#           JSON without a model
+#   record  forwards to --upstream with the caller's key and appends every
+#           exchange (including its latency) to the --cassette JSONL file
+#   replay  serves answers from --cassette, keyed on model + messages;
+#           misses fall back to synth (or 404 with --strict)
+#
+# Failure modes are injected independently of the mode: --error-rate (500),
+# --rate-limit-rate (429 with Retry-After), --rpm (a real per-minute budget
+# answering 429 + X-RateLimit-* once spent) and --truncate-rate (valid HTTP,
+# JSON cut mid-way, to exercise repair/enforcer). --seed makes the injected
+# latencies and failures reproducible. GET /stats returns request counters.
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from utils.rules import prescan
+
+
+###########################################
+# LATENCY
+###########################################
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """
+    "fixed:0.5", "uniform:0.2,1.5", "normal:0.8,0.2", "lognormal:mu,sigma"
+    (parameters of the underlying normal, so lognormal:0,0.5 has median 1s),
+    or "recorded" to replay cassette latencies.
+    """
+    kind, _, args = spec.partition(":")
+    params = [float(x) for x in args.split(",") if x.strip()]
+    if kind == "fixed":
+        return lambda: params[0] if params else 0.0
+    if kind == "uniform":
+        return lambda: rng.uniform(params[0], params[1])
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(params[0], params[1])
+    if kind == "recorded":
+        return lambda: 0.0  # per-entry value is used instead
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+
+###########################################
+# CASSETTES
+###########################################
+def request_key(body: Dict[str, Any]) -> str:
+    """Replay key: the model and the exact messages (temperature etc. ignored)."""
+    blob = json.dumps({"model": body.get("model"), "messages": body.get("messages")},
+                      sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Append-only JSONL of {key, model, status, elapsed, response}; last entry per key wins."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if path:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        self._entries[entry["key"]] = entry
+            except FileNotFoundError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(key)
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[entry["key"]] = entry
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+###########################################
+# SYNTHETIC ANSWERS
+###########################################
+_EXCERPT_RE = re.compile(r"^\[(\d+)\] ", re.MULTILINE)
+
+
+def _prompt_parts(body: Dict[str, Any]) -> Tuple[str, str]:
+    user = next((m.get("content", "") for m in reversed(body.get("messages") or [])
+                 if m.get("role") == "user"), "")
+    if "Ordinance:\n" in user:
+        head, ordinance = user.split("Ordinance:\n", 1)
+        for marker in ("Listing:\n", "Listing excerpts"):
+            if marker in head:
+                return marker + head.split(marker, 1)[1].rstrip("\n"), ordinance
+    return user, ""
+
+
+def _excerpts(listing_block: str) -> Dict[str, str]:
+    """[n] segments of a filtered-listing prompt (see utils.relevance.numbered)."""
+    body = listing_block.split("\n", 1)[1] if "\n" in listing_block else ""
+    body = body.split("\n\nIn fixed_segments", 1)[0]
+    marks = list(_EXCERPT_RE.finditer(body))
+    return {m.group(1): body[m.end():(marks[i + 1].start() if i + 1 < len(marks) else len(body))].rstrip("\n")
+            for i, m in enumerate(marks)}
+
+
+def _fix(text: str, findings: List[Dict[str, Any]]) -> str:
+    for f in sorted(findings, key=lambda f: -f["start"]):
+        text = text[:f["start"]] + "[removed: non-compliant clause]" + text[f["end"]:]
+    return text
+
+
+def synth_content(body: Dict[str, Any]) -> str:
+    """Deterministic scan answer: the pre-scan findings, phrased as the model would."""
+    listing_block, ordinance = _prompt_parts(body)
+    answer: Dict[str, Any] = {}
+    if listing_block.startswith("Listing excerpts"):
+        findings, fixed = [], {}
+        for n, text in _excerpts(listing_block).items():
+            found = prescan(text, ordinance)["findings"]
+            findings += found
+            fixed[n] = _fix(text, found)
+        answer["fixed_segments"] = fixed
+    else:
+        listing = listing_block[len("Listing:\n"):] if listing_block.startswith("Listing:\n") else listing_block
+        findings = prescan(listing, ordinance)["findings"]
+        answer["fixed_listing"] = _fix(listing, findings)
+    return json.dumps({
+        "risky_phrases": [f["phrase"] for f in findings],
+        **answer,
+        "confidence": 80 if findings else 90,
+        "citations": sorted({f["citation"] for f in findings}),
+        "notes": "synthetic response from openrouter_stub",
+    }, ensure_ascii=False)
+
+
+def completion(body: Dict[str, Any], content: str) -> Dict[str, Any]:
+    prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages") or [])
+    prompt_tokens, completion_tokens = max(1, prompt_chars // 4), max(1, len(content) // 4)
+    return {
+        "id": "gen-stub-" + hashlib.sha1(content.encode("utf-8")).hexdigest()[:12],
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+###########################################
+# SERVER
+###########################################
+class StubState:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.rng_lock = threading.Lock()
+        self.latency = parse_latency(args.latency, self.rng)
+        self.cassette = Cassette(args.cassette)
+        self.lock = threading.Lock()
+        self.window: List[float] = []
+        self.stats = {"requests": 0, "streamed": 0, "errors_injected": 0, "rate_limited": 0,
+                      "truncated": 0, "replay_hits": 0, "replay_misses": 0, "recorded": 0,
+                      "upstream_errors": 0}
+
+    def roll(self, p: float) -> bool:
+        with self.rng_lock:
+            return p > 0 and self.rng.random() < p
+
+    def sample_latency(self) -> float:
+        with self.rng_lock:
+            return self.latency()
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.stats[name] += 1
+
+    def take_rpm_slot(self) -> Tuple[bool, int, float]:
+        """(allowed, remaining, reset_epoch) for the --rpm sliding window."""
+        now = time.time()
+        with self.lock:
+            self.window = [t for t in self.window if now - t < 60]
+            if len(self.window) >= self.args.rpm:
+                return False, 0, self.window[0] + 60
+            self.window.append(now)
+            return True, self.args.rpm - len(self.window), self.window[0] + 60
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "OpenRouterStub/1.0"
+    protocol_version = "HTTP/1.1"
+    state: StubState  # set by make_server()
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        if self.state.args.verbose:
+            sys.stderr.write(f"[stub] {fmt % args}\n")
+
+    def _json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/stats":
+            with self.state.lock:
+                self._json(200, dict(self.state.stats, cassette_entries=len(self.state.cassette)))
+        else:
+            self._json(404, {"error": {"code": 404, "message": "not found"}})
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._json(404, {"error": {"code": 404, "message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._json(400, {"error": {"code": 400, "message": "invalid JSON"}})
+            return
+
+        state, args = self.state, self.state.args
+        state.count("requests")
+
+        rl_headers: Dict[str, str] = {}
+        if args.rpm:
+            allowed, remaining, reset = state.take_rpm_slot()
+            rl_headers = {"X-RateLimit-Limit": str(args.rpm), "X-RateLimit-Remaining": str(remaining),
+                          "X-RateLimit-Reset": str(int(reset * 1000))}
+            if not allowed:
+                state.count("rate_limited")
+                self._json(429, {"error": {"code": 429, "message": "Rate limit exceeded"}},
+                           dict(rl_headers, **{"Retry-After": str(max(1, int(reset - time.time()) + 1))}))
+                return
+        if state.roll(args.rate_limit_rate):
+            state.count("rate_limited")
+            self._json(429, {"error": {"code": 429, "message": "Rate limit exceeded"}},
+                       {"Retry-After": str(args.retry_after)})
+            return
+
+        delay = state.sample_latency()
+        if state.roll(args.error_rate):
+            time.sleep(delay)
+            state.count("errors_injected")
+            self._json(500, {"error": {"code": 500, "message": "injected upstream error"}})
+            return
+
+        status, response, recorded_delay = self._answer(body)
+        if args.latency == "recorded" and recorded_delay is not None:
+            delay = recorded_delay
+        if status != 200:
+            self._json(status, response, rl_headers)
+            return
+
+        content = response["choices"][0]["message"].get("content") or ""
+        if state.roll(args.truncate_rate):
+            state.count("truncated")
+            content = content[:max(1, len(content) // 2)]
+            response = dict(response, choices=[{"index": 0, "finish_reason": "length",
+                                                "message": {"role": "assistant", "content": content}}])
+
+        if body.get("stream"):
+            state.count("streamed")
+            self._stream(body, response, content, delay, rl_headers)
+        else:
+            time.sleep(delay)
+            self._json(200, response, rl_headers)
+
+    def _answer(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any], Optional[float]]:
+        state, args = self.state, self.state.args
+        key = request_key(body)
+        if args.mode == "replay":
+            entry = state.cassette.get(key)
+            if entry is not None:
+                state.count("replay_hits")
+                return entry["status"], entry["response"], entry.get("elapsed")
+            state.count("replay_misses")
+            if args.strict:
+                return 404, {"error": {"code": 404, "message": "no cassette entry for request"}}, None
+        elif args.mode == "record":
+            upstream_body = dict(body, stream=False)
+            started = time.monotonic()
+            try:
+                resp = requests.post(args.upstream, json=upstream_body, timeout=args.upstream_timeout,
+                                     headers={"Authorization": self.headers.get("Authorization", ""),
+                                              "Content-Type": "application/json"})
+            except requests.RequestException as e:
+                # Nothing to record; the caller sees a gateway error and retries.
+                state.count("upstream_errors")
+                return 502, {"error": {"code": 502, "message": f"upstream unreachable: {e}"}}, None
+            elapsed = time.monotonic() - started
+            try:
+                payload = resp.json()
+            except ValueError:
+                payload = {"error": {"code": resp.status_code, "message": resp.text[:500]}}
+            state.cassette.add({"key": key, "model": body.get("model"), "status": resp.status_code,
+                                "elapsed": round(elapsed, 4), "response": payload})
+            state.count("recorded")
+            return resp.status_code, payload, None
+        return 200, completion(body, synth_content(body)), None
+
+    def _stream(self, body: Dict[str, Any], response: Dict[str, Any], content: str,
+                delay: float, headers: Dict[str, str]) -> None:
+        """SSE in OpenRouter's shape: time-to-first-token ~ delay/3, the rest spread over chunks."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.close_connection = True
+
+        size = max(1, self.state.args.chunk_chars)
+        chunks = [content[i:i + size] for i in range(0, len(content), size)] or [""]
+        per_chunk = (delay * 2 / 3) / len(chunks)
+
+        def send(payload: str) -> None:
+            self.wfile.write(f"data: {payload}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+            time.sleep(delay / 3)
+            for piece in chunks:
+                send(json.dumps({"id": response.get("id"), "model": body.get("model"),
+                                 "choices": [{"index": 0, "delta": {"content": piece}}]}, ensure_ascii=False))
+                time.sleep(per_chunk)
+            send(json.dumps({"id": response.get("id"), "model": body.get("model"),
+                             "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                             "usage": response.get("usage")}))
+            send("[DONE]")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client stopped reading (e.g. a cancelled hedge)
+
+
+def make_server(args: argparse.Namespace) -> ThreadingHTTPServer:
+    handler = type("BoundStubHandler", (StubHandler,), {"state": StubState(args)})
+    # The default listen backlog (5) drops SYNs under the very concurrency
+    # the stub exists to simulate, and the client's reconnect delay then
+    # shows up as upstream latency.
+    server_cls = type("StubServer", (ThreadingHTTPServer,),
+                      {"request_queue_size": args.backlog, "daemon_threads": True})
+    return server_cls((args.host, args.port), handler)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Local OpenRouter stand-in with record/replay.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--backlog", type=int, default=1024,
+                        help="listen backlog; keep above the client's peak concurrency")
+    parser.add_argument("--mode", choices=["synth", "record", "replay"], default="synth")
+    parser.add_argument("--cassette", help="JSONL cassette to record to / replay from")
+    parser.add_argument("--strict", action="store_true", help="replay misses return 404 instead of synth")
+    parser.add_argument("--upstream", default="https://openrouter.ai/api/v1/chat/completions")
+    parser.add_argument("--upstream-timeout", type=float, default=60)
+    parser.add_argument("--latency", default="fixed:0",
+                        help="fixed:S | uniform:A,B | normal:MEAN,SD | lognormal:MU,SIGMA | recorded")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After for injected 429s")
+    parser.add_argument("--rpm", type=int, default=0, help="real requests/minute budget (0 = unlimited)")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="fraction of answers cut in half")
+    parser.add_argument("--chunk-chars", type=int, default=24, help="characters per SSE delta")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.mode in ("record", "replay") and not args.cassette:
+        print("[stub] --cassette is required for record/replay", file=sys.stderr)
+        return 2
+    server = make_server(args)
+    host, port = server.server_address[:2]
+    print(f"[stub] {args.mode} mode on http://{host}:{port}/api/v1/chat/completions", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
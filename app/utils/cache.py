@@ -0,0 +1,276 @@
+# utils/cache.py
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+CACHE_PATH = os.getenv("SCAN_CACHE_PATH", str(Path(__file__).resolve().parent / "scan_cache.db"))
+CACHE_TTL = int(os.getenv("SCAN_CACHE_TTL", 7 * 24 * 3600))
+MEMORY_MAX_ENTRIES = int(os.getenv("SCAN_CACHE_MEMORY_ENTRIES", 256))
+DISK_MAX_ENTRIES = int(os.getenv("SCAN_CACHE_DISK_ENTRIES", 20000))
+
+# Expired/overflow rows are swept every N writes rather than on every set.
+SWEEP_EVERY = 50
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: unified newlines, no trailing spaces."""
+    text = (text or "").replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+
+def make_key(**parts: Any) -> str:
+    """Stable sha256 over the given parts (order-independent)."""
+    blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier result cache: an in-memory LRU in front of a SQLite table.
+
+    Values are stored as JSON so callers always get a fresh copy.
+    If the SQLite file cannot be opened (read-only deploys), the cache
+    silently degrades to memory only.
+    """
+
+    def __init__(self, path: Optional[str] = CACHE_PATH, ttl: int = CACHE_TTL,
+                 memory_max: int = MEMORY_MAX_ENTRIES, disk_max: int = DISK_MAX_ENTRIES):
+        self.ttl = ttl
+        self.memory_max = memory_max
+        self.disk_max = disk_max
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._writes = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+        self._conn = self._open(path) if path else None
+
+    def _open(self, path: str) -> Optional[sqlite3.Connection]:
+        try:
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scan_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_cache_accessed ON scan_cache(accessed_at)")
+            return conn
+        except sqlite3.Error:
+            return None
+
+    def _remember(self, key: str, raw: str, expires_at: float) -> None:
+        self._memory[key] = (raw, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit and hit[1] > now:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return json.loads(hit[0])
+            if hit:
+                del self._memory[key]
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT value, expires_at FROM scan_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row and row[1] > now:
+                        self._conn.execute(
+                            "UPDATE scan_cache SET accessed_at = ? WHERE key = ?", (now, key)
+                        )
+                        self._remember(key, row[0], row[1])
+                        self._stats["disk_hits"] += 1
+                        return json.loads(row[0])
+                except sqlite3.Error:
+                    pass
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.time()
+        expires_at = now + self.ttl
+        raw = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, raw, expires_at)
+            self._stats["sets"] += 1
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO scan_cache (key, value, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, raw, expires_at, now),
+                )
+                self._writes += 1
+                if self._writes % SWEEP_EVERY == 0:
+                    self._sweep(now)
+            except sqlite3.Error:
+                pass
+
+    def _sweep(self, now: float) -> None:
+        cur = self._conn.execute("DELETE FROM scan_cache WHERE expires_at <= ?", (now,))
+        evicted = max(cur.rowcount, 0)
+        cur = self._conn.execute(
+            "DELETE FROM scan_cache WHERE key IN ("
+            "  SELECT key FROM scan_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?"
+            ")",
+            (self.disk_max,),
+        )
+        evicted += max(cur.rowcount, 0)
+        self._stats["evictions"] += evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                try:
+                    self._conn.execute("DELETE FROM scan_cache")
+                except sqlite3.Error:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["memory_entries"] = len(self._memory)
+            out["disk_enabled"] = self._conn is not None
+        lookups = out["memory_hits"] + out["disk_hits"] + out["misses"]
+        out["hit_rate"] = round((out["memory_hits"] + out["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return out
+
+
+class _Flight:
+    __slots__ = ("done", "raw", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.raw: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        # (loop, future) of async followers, woken from the leader's thread.
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = []
+
+
+def _wake(waiter: "asyncio.Future[None]") -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs
+    fn(), later callers block until it finishes and get a copy of its
+    result (or its exception). If the first caller is interrupted rather
+    than failing, a waiting caller takes over. Sync and async callers
+    share flights, whichever thread or event loop they run on. Nothing is
+    kept once the call completes; that is the ResultCache's job.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._stats = {"leaders": 0, "coalesced": 0}
+
+    def _join(self, key: str, loop: Optional[asyncio.AbstractEventLoop] = None
+              ) -> Tuple[_Flight, bool, Optional["asyncio.Future[None]"]]:
+        """(flight, leader, waiter): lead a new flight or follow the running one."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self._stats["leaders"] += 1
+                return flight, True, None
+            self._stats["coalesced"] += 1
+            waiter = None
+            if loop is not None:
+                waiter = loop.create_future()
+                flight.waiters.append((loop, waiter))
+            return flight, False, waiter
+
+    @staticmethod
+    def _shared(flight: _Flight) -> Optional[Dict[str, Any]]:
+        """The leader's result for a follower; None if the leader was interrupted."""
+        if flight.error is not None:
+            raise flight.error
+        if flight.raw is not None:
+            return json.loads(flight.raw)
+        # The leader was interrupted (KeyboardInterrupt, SystemExit,
+        # cancellation): that is not our failure, so run it ourselves.
+        return None
+
+    def _finish(self, key: str, flight: _Flight) -> None:
+        with self._lock:
+            del self._flights[key]
+            flight.done.set()
+            waiters = flight.waiters
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                pass  # that caller's loop is gone
+
+    def do(self, key: str, fn: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+        """Returns (result, shared); shared is True when another caller's call was reused."""
+        while True:
+            flight, leader, _ = self._join(key)
+            if leader:
+                break
+            flight.done.wait()
+            result = self._shared(flight)
+            if result is not None:
+                return result, True
+
+        try:
+            result = fn()
+            # Snapshot before the leader's caller can mutate it.
+            flight.raw = json.dumps(result, ensure_ascii=False)
+            return result, False
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            self._finish(key, flight)
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], bool]:
+        """do() for coroutines: followers wait without blocking their event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            flight, leader, waiter = self._join(key, loop)
+            if leader:
+                break
+            await waiter
+            result = self._shared(flight)
+            if result is not None:
+                return result, True
+
+        try:
+            result = await fn()
+            flight.raw = json.dumps(result, ensure_ascii=False)
+            return result, False
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            self._finish(key, flight)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["in_flight"] = len(self._flights)
+        return out
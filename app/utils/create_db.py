@@ -1,6 +1,8 @@
 import sqlite3
 
-conn = sqlite3.connect("ordinances.db")
+from db import DB_PATH, index_ordinance
+
+conn = sqlite3.connect(DB_PATH)
 cur = conn.cursor()
 
 # Create table
@@ -11,6 +13,12 @@ CREATE TABLE IF NOT EXISTS ordinances (
     text TEXT NOT NULL
 )
 """)
+# WAL lets the app keep reading while this script (or another writer) commits.
+cur.execute("PRAGMA journal_mode=WAL")
+# Older databases may hold several rows per city: keep the newest one
+# before enforcing uniqueness.
+cur.execute("DELETE FROM ordinances WHERE id NOT IN (SELECT MAX(id) FROM ordinances GROUP BY city)")
+cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_ordinances_city ON ordinances(city)")
 
 # Insert sample ordinances (you can replace these later)
 sample_data = [
@@ -19,9 +27,19 @@ sample_data = [
     ("Berlin", "Landlords must allow pets unless they demonstrate a justified reason. Blanket bans on all pets are illegal in Berlin under tenancy law.")
 ]
 
-cur.executemany("INSERT INTO ordinances (city, text) VALUES (?, ?)", sample_data)
+# Re-running the script updates existing cities instead of duplicating them.
+for city, text in sample_data:
+    cur.execute("UPDATE ordinances SET text = ? WHERE city = ?", (text, city))
+    if cur.rowcount == 0:
+        cur.execute("INSERT INTO ordinances (city, text) VALUES (?, ?)", (city, text))
 
 conn.commit()
+
+# Chunk every ordinance into sections and index them for retrieval (FTS5).
+for city, text in cur.execute("SELECT city, text FROM ordinances").fetchall():
+    n = index_ordinance(conn, city, text)
+    print(f"Indexed {city}: {n} section(s)")
+
 conn.close()
 
 print("Database created and sample data inserted.")
@@ -1,27 +1,267 @@
+import hashlib
+import os
+import re
 import sqlite3
+import threading
+import time
 from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    from utils import metrics
+except ImportError:  # imported as a top-level module by create_db.py
+    import metrics
 
 DB_PATH = Path(__file__).resolve().parent / "ordinances.db"
+NO_ORDINANCE = "No ordinance found for this city."
+# How stale the ordinance cache may be after another process writes the DB.
+DB_VERSION_CHECK_MS = float(os.getenv("DB_VERSION_CHECK_MS", 500))
+
+# One long-lived connection per thread (sqlite3 connections are not
+# shareable across threads by default), plus a process-wide cache of
+# ordinance texts that is dropped whenever any connection commits. The
+# check runs on one shared watcher connection, at most once per
+# DB_VERSION_CHECK_MS, so a thread's first read sees the same baseline as
+# every other thread's. Nothing on the read path writes: schema setup (WAL,
+# the unique city index) and the section index are built by create_db.py.
+_local = threading.local()
+_cache_lock = threading.Lock()
+_ordinance_cache: Dict[str, Optional[str]] = {}
+_cities_cache: Optional[List[str]] = None
+_watch_lock = threading.Lock()
+_watcher: Optional[sqlite3.Connection] = None
+_data_version: Optional[int] = None
+_checked_at = float("-inf")
+
+
+def get_connection() -> sqlite3.Connection:
+    """The calling thread's persistent connection (do not close it)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH)
+        _local.conn = conn
+    return conn
+
+
+def close_connection() -> None:
+    """Close the calling thread's connection, if any."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def invalidate_cache() -> None:
+    global _cities_cache
+    with _cache_lock:
+        _ordinance_cache.clear()
+        _cities_cache = None
+
 
-def get_connection():
-    return sqlite3.connect(DB_PATH)
+def _check_version() -> None:
+    """Drop the cache if the DB changed since the last check, in any thread."""
+    global _watcher, _data_version, _checked_at
+    if time.monotonic() - _checked_at < DB_VERSION_CHECK_MS / 1000:
+        return
+    # One thread checks; the others keep reading the cache meanwhile.
+    if not _watch_lock.acquire(blocking=False):
+        return
+    try:
+        if _watcher is None:
+            _watcher = sqlite3.connect(DB_PATH, check_same_thread=False)
+        version = _watcher.execute("PRAGMA data_version").fetchone()[0]
+        if _data_version is not None and version != _data_version:
+            invalidate_cache()
+        _data_version = version
+        _checked_at = time.monotonic()
+    finally:
+        _watch_lock.release()
 
-def list_cities():
+
+def list_cities() -> List[str]:
     """Return all cities in the DB."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT city FROM ordinances ORDER BY city ASC")
-    rows = cursor.fetchall()
-    conn.close()
-    return [r[0] for r in rows]
+    global _cities_cache
+    _check_version()
+    cities = _cities_cache
+    if cities is None:
+        rows = get_connection().execute("SELECT DISTINCT city FROM ordinances ORDER BY city ASC").fetchall()
+        cities = [r[0] for r in rows]
+        with _cache_lock:
+            _cities_cache = cities
+    return list(cities)
+
 
 def get_ordinance(city: str) -> str:
     """Return the ordinance text for a given city."""
+    _check_version()
+    if city in _ordinance_cache:
+        text = _ordinance_cache[city]
+    else:
+        row = get_connection().execute("SELECT text FROM ordinances WHERE city = ?", (city,)).fetchone()
+        text = row[0] if row else None
+        with _cache_lock:
+            _ordinance_cache[city] = text
+    if text is None:
+        return NO_ORDINANCE
+    return text
+
+def get_ordinances(cities: List[str]) -> Dict[str, str]:
+    """Ordinance texts for several cities at once; unknown cities are left out."""
+    _check_version()
+    wanted = list(dict.fromkeys(cities))
+    missing = [c for c in wanted if c not in _ordinance_cache]
+    if missing:
+        placeholders = ",".join("?" * len(missing))
+        rows = dict(get_connection().execute(
+            f"SELECT city, text FROM ordinances WHERE city IN ({placeholders})", missing
+        ).fetchall())
+        with _cache_lock:
+            for city in missing:
+                _ordinance_cache[city] = rows.get(city)
+    found = {c: _ordinance_cache.get(c) for c in wanted}
+    return {c: text for c, text in found.items() if text is not None}
+
+###########################################
+# SECTION RETRIEVAL (FTS5)
+###########################################
+# Ordinances shorter than this are sent to the model whole.
+RETRIEVAL_MIN_CHARS = int(os.getenv("RETRIEVAL_MIN_CHARS", 4000))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 6))
+SECTION_MAX_CHARS = 1200
+
+# Always searched for, on top of the listing's own words.
+_DOMAIN_TERMS = ["pet", "pets", "animal", "animals", "dog", "cat", "deposit", "fee",
+                 "breed", "weight", "service", "assistance", "support", "tenant", "landlord"]
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "are", "not", "you", "your", "our",
+    "all", "any", "per", "from", "will", "must", "may", "have", "has", "but", "only",
+}
+_HEADING_RE = re.compile(r"^\s*(?:§|sec(?:tion)?\.?\s|article\s|chapter\s|\(?[0-9]+(?:\.[0-9]+)*[.)]\s)", re.I)
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+_WORD_RE = re.compile(r"[A-Za-z0-9]{3,}")
+
+# city -> text hash whose sections are known to be indexed
+_indexed: Dict[str, str] = {}
+
+
+def chunk_ordinance(text: str, max_chars: int = SECTION_MAX_CHARS) -> List[str]:
+    """Split an ordinance into sections: headings first, then paragraphs, then sentences."""
+    blocks: List[str] = []
+    current: List[str] = []
+    for line in (text or "").splitlines():
+        if (_HEADING_RE.match(line) or not line.strip()) and current:
+            blocks.append("\n".join(current).strip())
+            current = []
+        if line.strip():
+            current.append(line)
+    if current:
+        blocks.append("\n".join(current).strip())
+
+    sections: List[str] = []
+    for block in blocks:
+        if len(block) <= max_chars:
+            sections.append(block)
+            continue
+        piece = ""
+        for sentence in _SENTENCE_SPLIT_RE.split(block):
+            if piece and len(piece) + len(sentence) + 1 > max_chars:
+                sections.append(piece)
+                piece = ""
+            piece = f"{piece} {sentence}".strip()
+        if piece:
+            sections.append(piece)
+    return [s for s in sections if s]
+
+
+def _ensure_section_tables(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS ordinance_sections
+        USING fts5(city UNINDEXED, position UNINDEXED, text, tokenize='porter unicode61')
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ordinance_index (
+            city TEXT PRIMARY KEY,
+            text_hash TEXT NOT NULL
+        )
+    """)
+
+
+def index_ordinance(conn: sqlite3.Connection, city: str, text: str) -> int:
+    """(Re)build the FTS sections for one city. Returns the number of sections."""
+    _ensure_section_tables(conn)
+    sections = chunk_ordinance(text)
+    conn.execute("DELETE FROM ordinance_sections WHERE city = ?", (city,))
+    conn.executemany(
+        "INSERT INTO ordinance_sections (city, position, text) VALUES (?, ?, ?)",
+        [(city, i, s) for i, s in enumerate(sections)],
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO ordinance_index (city, text_hash) VALUES (?, ?)",
+        (city, hashlib.sha1(text.encode("utf-8")).hexdigest()),
+    )
+    conn.commit()
+    return len(sections)
+
+
+def _fts_query(listing: str) -> str:
+    words = {w.lower() for w in _WORD_RE.findall(listing or "")} - _STOPWORDS
+    terms = sorted(words)[:64] + _DOMAIN_TERMS
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+
+def relevant_sections(conn: sqlite3.Connection, city: str, listing: str,
+                      k: int = RETRIEVAL_TOP_K) -> List[str]:
+    """Top-k sections by BM25, returned in their original order."""
+    rows = conn.execute(
+        "SELECT position, text FROM ordinance_sections "
+        "WHERE ordinance_sections MATCH ? AND city = ? "
+        "ORDER BY bm25(ordinance_sections) LIMIT ?",
+        (_fts_query(listing), city, k),
+    ).fetchall()
+    if not rows:
+        rows = conn.execute(
+            "SELECT position, text FROM ordinance_sections WHERE city = ? "
+            "ORDER BY CAST(position AS INTEGER) LIMIT ?",
+            (city, k),
+        ).fetchall()
+    return [text for _, text in sorted(rows, key=lambda r: int(r[0]))]
+
+
+def get_ordinance_context(city: str, listing: str, k: int = RETRIEVAL_TOP_K) -> str:
+    """
+    Ordinance text to put in the prompt for this listing.
+
+    Short ordinances are returned whole; long ones are reduced to the k
+    sections most relevant to the listing, once create_db.py has indexed
+    that exact text (until then they are returned whole too).
+    """
+    with metrics.span("db"):
+        return _context_for(city, get_ordinance(city), listing, k)
+
+
+def get_ordinance_contexts(cities: List[str], listing: str, k: int = RETRIEVAL_TOP_K) -> Dict[str, str]:
+    """get_ordinance_context for several cities, resolved with a single query."""
+    with metrics.span("db"):
+        return {city: _context_for(city, text, listing, k) for city, text in get_ordinances(cities).items()}
+
+
+def _context_for(city: str, text: str, listing: str, k: int) -> str:
+    if text == NO_ORDINANCE or len(text) <= RETRIEVAL_MIN_CHARS:
+        return text
+
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT text FROM ordinances WHERE city = ?", (city,))
-    row = cursor.fetchone()
-    conn.close()
-    if not row:
-        return "No ordinance found for this city."
-    return row[0]
+    text_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    try:
+        if _indexed.get(city) != text_hash:
+            row = conn.execute("SELECT text_hash FROM ordinance_index WHERE city = ?", (city,)).fetchone()
+            if not row or row[0] != text_hash:
+                # Sections are indexed by create_db.py; until it is re-run
+                # for this text, send the whole ordinance.
+                metrics.incr("ordinance_index_stale", city=city)
+                return text
+            _indexed[city] = text_hash
+        sections = relevant_sections(conn, city, listing, k)
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5, or the section tables were never built.
+        return text
+    return "\n\n".join(sections) if sections else text
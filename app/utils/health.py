@@ -0,0 +1,150 @@
+# utils/health.py
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+# Breaker opens when at least MIN_REQUESTS calls in the window failed at
+# ERROR_THRESHOLD or more, then lets one probe through after COOLDOWN.
+WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", 60))
+MIN_REQUESTS = int(os.getenv("BREAKER_MIN_REQUESTS", 5))
+ERROR_THRESHOLD = float(os.getenv("BREAKER_ERROR_THRESHOLD", 0.5))
+COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", 30))
+
+# Adaptive timeout = observed p99 * multiplier, clamped to [min, max].
+TIMEOUT_MULTIPLIER = float(os.getenv("ADAPTIVE_TIMEOUT_MULTIPLIER", 2.0))
+TIMEOUT_MIN = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", 5))
+LATENCY_MIN_SAMPLES = 20
+LATENCY_SAMPLES = 500
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class ModelHealth:
+    """Rolling error rate, latency samples and circuit state for one model."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.state = CLOSED
+        self._lock = threading.Lock()
+        self._outcomes: deque = deque()  # (timestamp, ok)
+        self._latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > WINDOW_SECONDS:
+            self._outcomes.popleft()
+
+    def _error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for _, ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def available(self) -> bool:
+        """
+        Whether allow() would let a request through now, without claiming
+        the half-open probe. Callers check this before queueing for a
+        rate-limit slot, then call allow() once the wait is over.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at >= COOLDOWN_SECONDS
+            return not self._probe_in_flight
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now. In half-open state only one probe is let through."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= COOLDOWN_SECONDS:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self) -> None:
+        """
+        Hand back an allow() that ended without an outcome (cancelled or
+        interrupted), so the next caller may probe instead of the breaker
+        staying half-open forever. No-op outside half-open state.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record(self, ok: bool, latency: Optional[float] = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if ok and latency is not None:
+                self._latencies.append(latency)
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self.state = OPEN
+                    self._opened_at = now
+                return
+            self._outcomes.append((now, ok))
+            self._trim(now)
+            if (self.state == CLOSED and len(self._outcomes) >= MIN_REQUESTS
+                    and self._error_rate() >= ERROR_THRESHOLD):
+                self.state = OPEN
+                self._opened_at = now
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < LATENCY_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+    def timeout(self, ceiling: float) -> float:
+        """Request timeout derived from observed p99, never above the configured ceiling."""
+        p99 = self.latency_percentile(0.99)
+        if p99 is None:
+            return ceiling
+        return min(ceiling, max(TIMEOUT_MIN, p99 * TIMEOUT_MULTIPLIER))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._trim(time.monotonic())
+            state, error_rate, calls = self.state, self._error_rate(), len(self._outcomes)
+        return {
+            "state": state,
+            "error_rate": round(error_rate, 4),
+            "calls_in_window": calls,
+            "p50": self.latency_percentile(0.5),
+            "p99": self.latency_percentile(0.99),
+        }
+
+
+_registry: Dict[str, ModelHealth] = {}
+_registry_lock = threading.Lock()
+
+
+def get_health(model: str) -> ModelHealth:
+    """Process-wide health tracker for a model, shared by every session."""
+    health = _registry.get(model)
+    if health is None:
+        with _registry_lock:
+            health = _registry.setdefault(model, ModelHealth(model))
+    return health
+
+
+def health_snapshot() -> Dict[str, Dict[str, Any]]:
+    with _registry_lock:
+        models = list(_registry.items())
+    return {model: h.snapshot() for model, h in models}
+
+
+def is_failure_status(status: Optional[int]) -> bool:
+    """Statuses that say the model/provider is unhealthy (not the caller's fault or a rate limit)."""
+    return status is None or status >= 500 or status == 408
@@ -0,0 +1,56 @@
+# utils/http.py
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connections kept alive per host, and number of distinct hosts pooled.
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 32))
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 4))
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    # Retries are handled by the callers (with their own backoff), so the
+    # adapter never retries on its own. pool_block=False lets bursts above
+    # POOL_MAXSIZE open extra short-lived connections instead of stalling.
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=0,
+        pool_block=False,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Process-wide keep-alive session.
+
+    The module is imported once per Streamlit server process, so every
+    browser session (and every script thread) shares the same pool of
+    TLS connections.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def reset_session() -> None:
+    """Drop the pooled connections (e.g. after a fork)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
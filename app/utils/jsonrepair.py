@@ -0,0 +1,196 @@
+# utils/jsonrepair.py
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?$")
+_LITERALS = {"true": "true", "false": "false", "null": "null",
+             "True": "true", "False": "false", "None": "null"}
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f",
+            "/": "/", "\\": "\\", '"': '"', "'": "'"}
+_STRUCTURAL = set("{}[]:,")
+
+# Token kinds
+STRING, WORD, PUNCT = "string", "word", "punct"
+
+
+def _closes_string(text: str, i: int) -> bool:
+    """A quote at text[i] ends the string only if structure (or EOF) follows."""
+    j = i + 1
+    n = len(text)
+    while j < n and text[j] in " \t\r\n":
+        j += 1
+    return j >= n or text[j] in ",:}]"
+
+
+def _read_string(text: str, i: int) -> Tuple[str, int, bool]:
+    """Read a '- or "-quoted string starting at text[i]. Returns (value, next_i, complete)."""
+    quote = text[i]
+    i += 1
+    n = len(text)
+    out: List[str] = []
+    while i < n:
+        ch = text[i]
+        if ch == "\\" and i + 1 < n:
+            nxt = text[i + 1]
+            if nxt == "u" and i + 5 < n:
+                try:
+                    out.append(chr(int(text[i + 2:i + 6], 16)))
+                    i += 6
+                    continue
+                except ValueError:
+                    pass
+            out.append(_ESCAPES.get(nxt, nxt))
+            i += 2
+            continue
+        if ch == quote and _closes_string(text, i):
+            return "".join(out), i + 1, True
+        out.append(ch)
+        i += 1
+    return "".join(out), i, False
+
+
+def _tokens(text: str, start: int) -> Iterator[Tuple[str, Any, bool]]:
+    i = start
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch in " \t\r\n":
+            i += 1
+        elif ch in _STRUCTURAL:
+            yield PUNCT, ch, True
+            i += 1
+        elif ch in "\"'":
+            value, i, complete = _read_string(text, i)
+            yield STRING, value, complete
+        elif ch == "`":
+            i += 1  # stray code-fence backticks
+        else:
+            j = i
+            while j < n and text[j] not in _STRUCTURAL and text[j] not in " \t\r\n\"'`":
+                j += 1
+            yield WORD, text[i:j], j < n
+            i = j
+
+
+def _word_to_json(word: str) -> Optional[str]:
+    if word in _LITERALS:
+        return _LITERALS[word]
+    if _NUMBER.match(word):
+        return word
+    return None
+
+
+def repair_json(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Best-effort, single-pass repair of an LLM's "JSON" answer.
+
+    Handles code fences and surrounding prose, single-quoted strings,
+    unescaped quotes/newlines inside strings, Python literals, bare keys,
+    missing or trailing commas, and output truncated mid-way (open
+    strings and containers are closed, dangling keys are dropped).
+    Returns the parsed object, or None if nothing usable was found.
+    """
+    return repair_json_checked(text)[0]
+
+
+def repair_json_checked(text: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    repair_json(), plus whether the text was cut off: an open string or
+    container had to be closed, or a partial number/literal was dropped.
+    Such an answer parses, but its last values are incomplete.
+    """
+    if not text:
+        return None, False
+    start = text.find("{")
+    if start == -1:
+        return None, False
+    truncated = False
+
+    out: List[str] = []
+    # frame: [kind, state, member_count, mark]; object states: key/colon/value
+    stack: List[list] = []
+
+    def begin_member(frame: list) -> None:
+        frame[3] = len(out)
+        if frame[2]:
+            out.append(",")
+        frame[2] += 1
+
+    def drop_member(frame: list) -> None:
+        del out[frame[3]:]
+        frame[2] -= 1
+
+    def emit_value(fragment: str) -> bool:
+        frame = stack[-1]
+        if frame[0] == "[":
+            begin_member(frame)
+        elif frame[1] != "value":
+            return False
+        out.append(fragment)
+        if frame[0] == "{":
+            frame[1] = "key"
+        return True
+
+    for kind, value, complete in _tokens(text, start):
+        if kind == PUNCT and value in "{[":
+            if stack and not emit_value(value):
+                return None, False
+            if not stack:
+                out.append(value)
+            stack.append([value, "key" if value == "{" else "value", 0, len(out)])
+            continue
+
+        if not stack:
+            break  # prose after the closing brace
+
+        frame = stack[-1]
+
+        if kind == PUNCT:
+            if value in "}]":
+                if frame[0] == "{" and frame[1] in ("colon", "value"):
+                    drop_member(frame)
+                stack.pop()
+                out.append("}" if frame[0] == "{" else "]")
+                if not stack:
+                    break
+            elif value == ":" and frame[0] == "{" and frame[1] == "colon":
+                out.append(":")
+                frame[1] = "value"
+            # "," is implied by begin_member; stray ":" are ignored
+            continue
+
+        if not complete:
+            truncated = True
+            if kind == WORD:
+                break  # truncated number/literal: drop it below
+
+        if kind == STRING:
+            fragment = json.dumps(value, ensure_ascii=False)
+        else:
+            fragment = _word_to_json(value) or json.dumps(value, ensure_ascii=False)
+
+        if frame[0] == "{" and frame[1] == "key":
+            begin_member(frame)
+            out.append(json.dumps(value, ensure_ascii=False))
+            frame[1] = "colon"
+        elif frame[0] == "{" and frame[1] == "colon":
+            # value without a colon: "key" "value"
+            out.append(":" + fragment)
+            frame[1] = "key"
+        else:
+            emit_value(fragment)
+
+    # Truncated output: close whatever is still open.
+    truncated = truncated or bool(stack)
+    while stack:
+        frame = stack.pop()
+        if frame[0] == "{" and frame[1] in ("colon", "value"):
+            drop_member(frame)
+        out.append("}" if frame[0] == "{" else "]")
+
+    try:
+        parsed = json.loads("".join(out))
+    except ValueError:
+        return None, False
+    return (parsed, truncated) if isinstance(parsed, dict) else (None, False)
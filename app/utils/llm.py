@@ -2,10 +2,20 @@
 import os
 import requests
 import json
+import threading
 import time
-import re
-from typing import Dict, Any, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Dict, Any, List, Optional, Callable, Iterator
 import streamlit as st
+from utils.cache import ResultCache, SingleFlight, make_key, normalize_text
+from utils.health import get_health, is_failure_status
+from utils.http import get_session
+from utils.jsonrepair import repair_json_checked
+from utils import metrics, relevance
+from utils.profiling import profiled
+from utils.ratelimit import MAX_QUEUE_WAIT, limiter_for
+from utils.rules import prescan
+from utils.stream import RiskyPhraseStream
 
 # OPENROUTER_KEY = os.getenv("api_key")
 def load_api_key():
@@ -28,12 +38,26 @@ OPENROUTER_KEY = load_api_key()
 # OPENROUTER_KEY = st.secrets.get("api_key")
 MODEL = os.getenv("MODEL", "x-ai/grok-4.1-fast:free")
 MODEL_FALLBACK = os.getenv("MODEL_FALLBACK", "meta-llama/llama-3-8b-instruct")
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Point at tools/openrouter_stub.py (or any compatible endpoint) for offline runs.
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
 
 TIMEOUT = 30
+MULTI_CITY_WORKERS = int(os.getenv("MULTI_CITY_WORKERS", 8))
+# Parallel requests for one long listing split by relevance.chunk_excerpts.
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", 4))
+
+# Hedging: race MODEL_FALLBACK once the primary is slower than this
+# percentile of its recent successful latencies.
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1") == "1"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 0.9))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", 8.0))
 MAX_RETRIES = 3
 BACKOFF_FACTOR = 1.5
 
+# Bump whenever SYSTEM_PROMPT or the user prompt template changes so
+# cached results produced by the old prompt are no longer served.
+PROMPT_VERSION = "2"
+
 SYSTEM_PROMPT = (
     "You are a cautious compliance-checking assistant. You are NOT a lawyer. "
     "You compare rental listings against ordinances. Output JSON only."
@@ -46,52 +70,207 @@ EMPTY_RESULT = {
     "citations": [],
     "notes": "parse_error_or_empty_response"
 }
+TRUNCATED_NOTE = ("The model's answer was cut off, so the listing was left as written; "
+                  "the flagged phrases may be incomplete.")
 
-def _extract_json_from_text(text: str) -> Optional[str]:
-    m = re.search(r'(\{(?:[^{}]|(?R))*\})', text, re.S)
-    if m:
-        return m.group(1)
-    start = text.find("{")
-    end = text.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        return text[start:end+1]
-    return None
+_result_cache = ResultCache()
+# Identical scans running at the same time share one upstream call.
+_in_flight = SingleFlight()
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the scan result cache, plus in-flight coalescing."""
+    out = _result_cache.stats()
+    out["single_flight"] = _in_flight.stats()
+    return out
+
+def _store_result(key: str, result: Dict[str, Any]) -> None:
+    # Only successful, parsed results are worth keeping (all chunks included).
+    if "error" in result or result.get("notes") == EMPTY_RESULT["notes"]:
+        return
+    if result.get("_meta", {}).get("chunks", {}).get("failed"):
+        return
+    # A cut-off answer may well be complete next time.
+    if result.get("_meta", {}).get("truncated"):
+        return
+    _result_cache.set(key, result)
+
+def _no_pet_content_result(listing: str, pre: Dict[str, Any]) -> Dict[str, Any]:
+    """Result returned without an LLM call when the pre-scan finds nothing pet-related."""
+    return {
+        "risky_phrases": [],
+        "fixed_listing": listing,
+        "confidence": 95,
+        "citations": [],
+        "notes": "No pet-related content found; model not called.",
+        "_meta": {"model_used": None, "prescan": pre}
+    }
+
+def _scan_cache_key(listing: str, ordinance: str, model: str, enable_reasoning: bool) -> str:
+    return make_key(
+        listing=normalize_text(listing),
+        ordinance=normalize_text(ordinance),
+        model=model,
+        reasoning=enable_reasoning,
+        prompt_version=PROMPT_VERSION,
+    )
+
+# A parsed answer must carry at least one of these to count as an answer;
+# "{}" salvaged from prose ("Sorry, I cannot help with that {request}.")
+# does not.
+_ANSWER_KEYS = ("risky_phrases", "fixed_listing", "fixed_segments", "confidence")
+
+def _is_answer(parsed: Any) -> bool:
+    return isinstance(parsed, dict) and any(k in parsed for k in _ANSWER_KEYS)
 
 def _safe_load_json(text: str) -> Dict[str, Any]:
     if not text or not text.strip():
         return dict(EMPTY_RESULT)
     try:
-        return json.loads(text)
+        parsed = json.loads(text)
+        if _is_answer(parsed):
+            return parsed
     except Exception:
-        jblk = _extract_json_from_text(text)
-        if jblk:
-            try:
-                return json.loads(jblk)
-            except Exception:
-                return dict(EMPTY_RESULT)
+        pass
+    # Fences, prose, trailing commas, truncation... fixed locally so the
+    # enforcer round-trip is only paid when repair finds nothing usable.
+    # A cut-off answer is marked for _finalize, which must not trust it.
+    repaired, truncated = repair_json_checked(text)
+    if _is_answer(repaired):
+        if truncated:
+            repaired["_truncated"] = True
+        return repaired
     return dict(EMPTY_RESULT)
 
-def _call_openrouter(payload: Dict[str, Any], timeout: int = TIMEOUT) -> Dict[str, Any]:
-    headers = {
+def _headers() -> Dict[str, str]:
+    return {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {OPENROUTER_KEY}"
     }
+
+def _call_openrouter(payload: Dict[str, Any], timeout: Optional[float] = None,
+                     cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
+    headers = _headers()
+    model = payload.get("model", "")
+    health = get_health(model)
+    limiter = limiter_for(model)
+    queued = 0.0
     for attempt in range(1, MAX_RETRIES + 1):
+        if cancel is not None and cancel.is_set():
+            return {"error": "cancelled"}
+        # An open breaker fails fast instead of walking the retry ladder,
+        # and before taking a rate-limit slot another caller could use.
+        if not health.available():
+            metrics.incr("circuit_open", model=model)
+            return {"error": f"circuit_open: {payload.get('model')}"}
+        # Wait our turn in the shared per-key budget instead of finding out via 429.
+        waited = limiter.acquire(cancel=cancel)
+        if waited is None:
+            return {"error": "cancelled" if cancel is not None and cancel.is_set()
+                    else f"rate_limited: queue wait over {MAX_QUEUE_WAIT:.0f}s"}
+        queued += waited
+        if waited:
+            metrics.observe("queue_wait", waited, model=model)
+        # The breaker may have opened while we were queued.
+        if not health.allow():
+            metrics.incr("circuit_open", model=model)
+            return {"error": f"circuit_open: {payload.get('model')}"}
+        started = time.monotonic()
         try:
-            resp = requests.post(OPENROUTER_URL, headers=headers, json=payload, timeout=timeout)
+            resp = get_session().post(OPENROUTER_URL, headers=headers, json=payload,
+                                      timeout=timeout or health.timeout(TIMEOUT))
+            limiter.observe(resp.headers, resp.status_code)
             resp.raise_for_status()
-            return resp.json()
+            data = resp.json()
+            elapsed = time.monotonic() - started
+            health.record(True, elapsed)
+            metrics.observe("llm_call", elapsed, model=model)
+            metrics.record_usage(model, data.get("usage"))
+            data["_queue_wait"] = queued
+            return data
         except requests.RequestException as e:
+            status = e.response.status_code if e.response is not None else None
+            health.record(not is_failure_status(status))
+            metrics.observe("llm_call", time.monotonic() - started, model=model, error=status or "transport")
             if attempt == MAX_RETRIES:
                 return {"error": str(e)}
-            time.sleep(BACKOFF_FACTOR ** attempt)
+            metrics.incr("retries", model=model, status=status or "transport")
+            # On 429 the limiter has already pushed back every caller by
+            # Retry-After; the next acquire() does the waiting.
+            if status == 429:
+                continue
+            # Event.wait doubles as an interruptible sleep.
+            if cancel is not None:
+                cancel.wait(BACKOFF_FACTOR ** attempt)
+            else:
+                time.sleep(BACKOFF_FACTOR ** attempt)
+        except BaseException:
+            # Interrupted mid-request: no outcome to record, but a half-open
+            # probe must not stay claimed.
+            health.release_probe()
+            raise
     return {"error": "unknown_error"}
 
+def _stream_openrouter(payload: Dict[str, Any], timeout: Optional[float] = None) -> Iterator[str]:
+    """
+    Yield content deltas from a streaming (SSE) completion.
+
+    No retries here: callers fall back to _call_openrouter, which has them.
+    Raises requests.RequestException on transport or upstream errors.
+    """
+    health = get_health(payload.get("model", ""))
+    if not health.available():
+        raise requests.RequestException(f"circuit_open: {payload.get('model')}")
+    if limiter_for(payload.get("model", "")).acquire() is None:
+        raise requests.RequestException(f"rate_limited: queue wait over {MAX_QUEUE_WAIT:.0f}s")
+    if not health.allow():
+        raise requests.RequestException(f"circuit_open: {payload.get('model')}")
+    body = dict(payload, stream=True)
+    healthy = True
+    started = time.monotonic()
+    try:
+        yield from _read_stream(body, timeout or health.timeout(TIMEOUT))
+    except requests.RequestException as e:
+        status = e.response.status_code if e.response is not None else None
+        healthy = not is_failure_status(status)
+        raise
+    finally:
+        # Always settle the breaker (also when the consumer stops early).
+        # Full-stream duration is not comparable to a plain call, so no latency sample.
+        health.record(healthy)
+        metrics.observe("llm_stream", time.monotonic() - started, model=payload.get("model"),
+                        error=None if healthy else "1")
+
+def _read_stream(body: Dict[str, Any], timeout: float) -> Iterator[str]:
+    with get_session().post(OPENROUTER_URL, headers=_headers(), json=body,
+                            timeout=timeout, stream=True) as resp:
+        limiter_for(body.get("model", "")).observe(resp.headers, resp.status_code)
+        resp.raise_for_status()
+        resp.encoding = "utf-8"
+        for line in resp.iter_lines(decode_unicode=True):
+            # Blank lines separate events; ":" lines are keep-alive comments.
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+            if "error" in chunk:
+                raise requests.RequestException(str(chunk["error"]))
+            # OpenRouter sends usage on the final chunk.
+            metrics.record_usage(body.get("model"), chunk.get("usage"))
+            choices = chunk.get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                yield delta
+
 ###########################################
 # SECOND PASS JSON NORMALIZER (CRITICAL)
 ###########################################
-def enforce_json_structure(bad_output: str) -> dict:
-    payload = {
+def _enforcer_payload(bad_output: str) -> Dict[str, Any]:
+    return {
         "model": "meta-llama/llama-3.1-70b-instruct:free",
         "messages": [
             {"role": "system",
@@ -102,24 +281,84 @@ def enforce_json_structure(bad_output: str) -> dict:
         "temperature": 0.0
     }
 
-    resp = _call_openrouter(payload)
+def enforce_json_structure(bad_output: str) -> dict:
+    metrics.incr("enforcer_calls")
+    with metrics.span("enforcer"):
+        resp = _call_openrouter(_enforcer_payload(bad_output))
     try:
         txt = resp["choices"][0]["message"]["content"]
-        return json.loads(txt)
+        parsed = json.loads(txt)
+        return parsed if _is_answer(parsed) else dict(EMPTY_RESULT)
     except Exception:
         return dict(EMPTY_RESULT)
 
 ###########################################
 # MAIN ANALYSIS FUNCTION
 ###########################################
+@profiled()
 def analyze_listing(listing: str, ordinance: str, *,
                     model: Optional[str] = None,
-                    enable_reasoning: bool = False) -> Dict[str, Any]:
+                    enable_reasoning: bool = False,
+                    use_cache: bool = True,
+                    skip_irrelevant: bool = True) -> Dict[str, Any]:
+
+    pre = prescan(listing, ordinance)
+    metrics.observe("prescan", pre["elapsed_ms"] / 1000)
+    if skip_irrelevant and not pre["pet_related"]:
+        metrics.incr("skipped_no_pet_content")
+        return _no_pet_content_result(listing, pre)
 
     if not OPENROUTER_KEY:
         return {"error": "OPENROUTER_API_KEY missing", **EMPTY_RESULT}
 
     model = model or MODEL
+    key = _scan_cache_key(listing, ordinance, model, enable_reasoning)
+
+    if use_cache:
+        cached = _result_cache.get(key)
+        if cached is not None:
+            metrics.incr("cache_hits")
+            cached.setdefault("_meta", {})["cache"] = "hit"
+            return cached
+        metrics.incr("cache_misses")
+
+    def run() -> Dict[str, Any]:
+        chunks = relevance.chunk_excerpts(listing)
+        with metrics.span("scan", model=model):
+            if chunks:
+                result = _analyze_chunked(listing, ordinance, chunks, model=model,
+                                          enable_reasoning=enable_reasoning)
+            else:
+                result = _analyze(listing, ordinance, model=model, enable_reasoning=enable_reasoning)
+        result.setdefault("_meta", {})["prescan"] = pre
+        if use_cache:
+            _store_result(key, result)
+        return result
+
+    result, shared = _in_flight.do(key, run)
+    if shared:
+        metrics.incr("coalesced")
+        result.setdefault("_meta", {})["coalesced"] = True
+    return result
+
+def _build_payload(listing: str, ordinance: str, model: str,
+                   enable_reasoning: bool = False,
+                   excerpt: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # Long listings: only the pet-relevant passages (or one chunk of them)
+    # are sent, numbered, and the model rewrites those; _finalize stitches
+    # them back in.
+    excerpt = excerpt or relevance.extract(listing)
+    if excerpt["filtered"]:
+        metrics.incr("relevance_tokens_saved", excerpt["original_tokens"] - excerpt["sent_tokens"])
+        fixed_key = "  \"fixed_segments\": {\"<n>\": \"...\"},\n"
+        listing_block = (
+            "Listing excerpts (pet-related passages only, numbered [n]):\n"
+            f"{relevance.numbered(excerpt)}\n\n"
+            "In fixed_segments, give the compliant rewrite of every excerpt by its number.\n\n"
+        )
+    else:
+        fixed_key = "  \"fixed_listing\": \"...\",\n"
+        listing_block = f"Listing:\n{listing}\n\n"
 
     user_prompt = (
         "You MUST identify ANY illegal clauses based on the ordinance.\n"
@@ -127,13 +366,12 @@ def analyze_listing(listing: str, ordinance: str, *,
         "JSON KEYS:\n"
         "{\n"
         "  \"risky_phrases\": [...],\n"
-        "  \"fixed_listing\": \"...\",\n"
+        f"{fixed_key}"
         "  \"confidence\": 0-100,\n"
         "  \"citations\": [...],\n"
         "  \"notes\": \"...\"\n"
         "}\n\n"
-        "Listing:\n"
-        f"{listing}\n\n"
+        f"{listing_block}"
         "Ordinance:\n"
         f"{ordinance}\n"
     )
@@ -153,43 +391,394 @@ def analyze_listing(listing: str, ordinance: str, *,
     if enable_reasoning and ("grok" in model):
         payload["extra_body"] = {"reasoning": {"enabled": True}}
 
-    response = _call_openrouter(payload)
+    return payload
+
+def _needs_enforcer(parsed: Dict[str, Any]) -> bool:
+    # Only when neither json.loads nor local repair produced anything.
+    return parsed.get("notes") == EMPTY_RESULT["notes"] and not parsed.get("risky_phrases")
+
+def _finalize(parsed: Dict[str, Any], content: str, listing: str, model: str,
+              excerpt: Optional[Dict[str, Any]] = None, truncated: bool = False) -> Dict[str, Any]:
+    excerpt = excerpt or relevance.extract(listing)
+    truncated = parsed.pop("_truncated", False) or truncated
+    edits = []
+    if truncated:
+        # The rewrite stops mid-sentence: keep the listing as written.
+        metrics.incr("truncated_answers", model=model)
+        parsed.pop("fixed_segments", None)
+        parsed["fixed_listing"] = listing
+        if parsed.get("notes") != EMPTY_RESULT["notes"]:
+            parsed["notes"] = TRUNCATED_NOTE
+    elif excerpt["filtered"]:
+        # A fixed_listing here would only cover the excerpts; rebuild it from the original.
+        edits = relevance.rewrites(excerpt, parsed.pop("fixed_segments", None))
+        parsed["fixed_listing"] = relevance.apply(listing, edits)
+    parsed.setdefault("risky_phrases", [])
+    parsed.setdefault("citations", [])
+    parsed.setdefault("fixed_listing", listing)
+    parsed.setdefault("confidence", 50)
+
+    parsed["_meta"] = {
+        "model_used": model,
+        "raw_preview": content[:200] + "...",
+        "relevance": relevance.summary(excerpt),
+        "phrase_offsets": relevance.locate(parsed["risky_phrases"], listing),
+    }
+    if truncated:
+        parsed["_meta"]["truncated"] = True
+    if "chunk" in excerpt:
+        # Kept for _merge_chunks; context sentences belong to the previous chunk.
+        owned = {(seg["start"], seg["end"]) for seg in excerpt["segments"] if seg["owned"]}
+        parsed["_meta"]["edits"] = [e for e in edits if (e[0], e[1]) in owned]
+    return parsed
+
+def _attempt(listing: str, ordinance: str, model: str, enable_reasoning: bool = False,
+             cancel: Optional[threading.Event] = None,
+             excerpt: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """One model, no fallback. Returns a finalized result or an error dict."""
+    payload = _build_payload(listing, ordinance, model, enable_reasoning, excerpt)
+    response = _call_openrouter(payload, cancel=cancel)
 
     if "error" in response:
-        if model != MODEL_FALLBACK:
-            return analyze_listing(listing, ordinance, model=MODEL_FALLBACK)
         return {"error": response["error"], **EMPTY_RESULT}
 
     try:
         content = response["choices"][0]["message"]["content"]
+        with metrics.span("parse"):
+            parsed = _safe_load_json(content)
+        if _needs_enforcer(parsed):
+            if cancel is not None and cancel.is_set():
+                return {"error": "cancelled", **EMPTY_RESULT}
+            parsed = enforce_json_structure(content)
+        choice = response["choices"][0]
+        result = _finalize(parsed, content, listing, model, excerpt,
+                           truncated=choice.get("finish_reason") == "length")
+        result["_meta"]["queue_wait"] = round(response.get("_queue_wait", 0.0), 3)
+        return result
+    except Exception as e:
+        return {"error": f"parse_error: {str(e)}", **EMPTY_RESULT}
+
+def _analyze(listing: str, ordinance: str, *, model: str,
+             enable_reasoning: bool = False,
+             excerpt: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+
+    if HEDGE_ENABLED and model != MODEL_FALLBACK:
+        return _analyze_hedged(listing, ordinance, model=model, enable_reasoning=enable_reasoning,
+                               excerpt=excerpt)
+
+    result = _attempt(listing, ordinance, model, enable_reasoning, excerpt=excerpt)
+    if "error" in result and model != MODEL_FALLBACK:
+        return _fallback(listing, ordinance, excerpt)
+    return result
+
+def _fallback(listing: str, ordinance: str, excerpt: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    metrics.incr("fallbacks")
+    with metrics.span("fallback", model=MODEL_FALLBACK):
+        return _attempt(listing, ordinance, MODEL_FALLBACK, excerpt=excerpt)
+
+###########################################
+# HEDGED REQUESTS
+###########################################
+def hedge_delay(model: Optional[str] = None) -> float:
+    """Seconds to wait for the primary before racing the fallback."""
+    observed = get_health(model or MODEL).latency_percentile(HEDGE_PERCENTILE)
+    return HEDGE_DEFAULT_DELAY if observed is None else observed
+
+def _analyze_hedged(listing: str, ordinance: str, *, model: str,
+                    enable_reasoning: bool = False,
+                    excerpt: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Run the primary; if it has not answered by hedge_delay() (the
+    HEDGE_PERCENTILE of recent primary latencies), start the fallback
+    too and keep whichever valid result lands first.
+
+    The loser is cancelled: it makes no further retries or enforcer
+    calls, and its answer is discarded.
+    """
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hedge")
+    cancels = {model: threading.Event(), MODEL_FALLBACK: threading.Event()}
+    try:
+        primary = pool.submit(_attempt, listing, ordinance, model, enable_reasoning, cancels[model], excerpt)
+        done, _ = wait([primary], timeout=hedge_delay(model))
+        if done:
+            result = primary.result()
+            if "error" not in result:
+                return result
+            # Primary failed outright: plain fallback, nothing to race.
+            return _fallback(listing, ordinance, excerpt)
 
+        metrics.incr("hedges", model=model)
+        fallback = pool.submit(_attempt, listing, ordinance, MODEL_FALLBACK, False, cancels[MODEL_FALLBACK],
+                               excerpt)
+        pending = {primary: model, fallback: MODEL_FALLBACK}
+        result = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                pending.pop(fut)
+                result = fut.result()
+                if "error" not in result:
+                    for loser in pending.values():
+                        cancels[loser].set()
+                    metrics.incr("hedge_wins", winner="fallback" if fut is fallback else "primary")
+                    result["_meta"]["hedged"] = True
+                    return result
+        return result
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _parse_content(content: str, listing: str, ordinance: str, model: str) -> Dict[str, Any]:
+    try:
         ############################
         # FIRST ATTEMPT PARSE
         ############################
-        parsed = _safe_load_json(content)
+        with metrics.span("parse"):
+            parsed = _safe_load_json(content)
 
         ############################
         # SECOND PASS (ENFORCER)
         ############################
-        if parsed["confidence"] == 0 and not parsed["risky_phrases"]:
+        if _needs_enforcer(parsed):
             parsed = enforce_json_structure(content)
 
         ############################
         # FINAL SANITY CLEANING
         ############################
-        parsed.setdefault("risky_phrases", [])
-        parsed.setdefault("citations", [])
-        parsed.setdefault("fixed_listing", listing)
-        parsed.setdefault("confidence", 50)
-
-        parsed["_meta"] = {
-            "model_used": model,
-            "raw_preview": content[:200] + "..."
-        }
-
-        return parsed
+        return _finalize(parsed, content, listing, model)
 
     except Exception as e:
         if model != MODEL_FALLBACK:
-            return analyze_listing(listing, ordinance, model=MODEL_FALLBACK)
+            metrics.incr("fallbacks")
+            with metrics.span("fallback", model=MODEL_FALLBACK):
+                return _analyze(listing, ordinance, model=MODEL_FALLBACK)
         return {"error": f"parse_error: {str(e)}", **EMPTY_RESULT}
+
+###########################################
+# CHUNKED (MAP-REDUCE) ANALYSIS
+###########################################
+def _phrase_key(phrase: Any) -> str:
+    label = phrase if isinstance(phrase, str) else json.dumps(phrase, ensure_ascii=False)
+    return " ".join(label.lower().split())
+
+def _dedupe(items: List[Any]) -> List[Any]:
+    seen, out = set(), []
+    for item in items:
+        key = _phrase_key(item)
+        if key not in seen:
+            seen.add(key)
+            out.append(item)
+    return out
+
+def _analyze_chunked(listing: str, ordinance: str, chunks: List[Dict[str, Any]], *, model: str,
+                     enable_reasoning: bool = False,
+                     on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Analyze each chunk (see relevance.chunk_excerpts) as its own request,
+    CHUNK_WORKERS at a time, and merge. Each chunk gets the usual
+    retry/hedge/fallback handling. on_result(chunk_result) is called in
+    the caller's thread as chunks finish.
+    """
+    metrics.incr("chunked_scans")
+
+    def one(excerpt: Dict[str, Any]) -> Dict[str, Any]:
+        with metrics.span("chunk", model=model):
+            return _analyze(listing, ordinance, model=model, enable_reasoning=enable_reasoning, excerpt=excerpt)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(chunks)
+    with ThreadPoolExecutor(max_workers=max(1, min(CHUNK_WORKERS, len(chunks))),
+                            thread_name_prefix="chunk") as pool:
+        futures = {pool.submit(one, excerpt): i for i, excerpt in enumerate(chunks)}
+        for fut in as_completed(futures):
+            results[futures[fut]] = fut.result()
+            if on_result is not None and "error" not in results[futures[fut]]:
+                on_result(results[futures[fut]])
+    return _merge_chunks(listing, chunks, results)
+
+def _merge_chunks(listing: str, chunks: List[Dict[str, Any]],
+                  results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reduce step: one result for the whole listing from per-chunk results (in chunk order)."""
+    ok = [r for r in results if "error" not in r]
+    if not ok:
+        return results[0]
+
+    phrases = _dedupe([p for r in ok for p in r.get("risky_phrases", [])])
+    offsets = relevance.locate(phrases, listing)
+    first_seen = {o["phrase"]: o["start"] for o in offsets}
+    phrases.sort(key=lambda p: first_seen.get(p, len(listing)) if isinstance(p, str) else len(listing))
+
+    confidences = [r["confidence"] for r in ok if isinstance(r.get("confidence"), (int, float))]
+    notes = _dedupe([r["notes"] for r in ok if isinstance(r.get("notes"), str) and r["notes"].strip()])
+    failed = len(results) - len(ok)
+    if failed:
+        notes.append(f"{failed} of {len(results)} parts of this listing could not be analyzed; "
+                     f"their text is unchanged.")
+    truncated = sum(1 for r in ok if r["_meta"].get("truncated"))
+
+    summary = relevance.summary(relevance.extract(listing))
+    summary["sent_tokens"] = sum(c["sent_tokens"] for c in chunks)
+    return {
+        "risky_phrases": phrases,
+        "fixed_listing": relevance.apply(listing, [e for r in ok for e in r["_meta"].get("edits", [])]),
+        # The least confident part bounds the whole.
+        "confidence": min(confidences) if confidences else 50,
+        "citations": _dedupe([c for r in ok for c in r.get("citations", [])]),
+        "notes": " ".join(notes),
+        "_meta": {
+            "model_used": ok[0]["_meta"].get("model_used"),
+            "chunks": {"count": len(results), "failed": failed},
+            "relevance": summary,
+            "phrase_offsets": offsets,
+            "queue_wait": max(r["_meta"].get("queue_wait", 0.0) for r in ok),
+            "truncated": truncated > 0,
+        },
+    }
+
+###########################################
+# STREAMING ANALYSIS
+###########################################
+@profiled()
+def analyze_listing_stream(listing: str, ordinance: str, *,
+                           on_phrase: Callable[[Any], None],
+                           model: Optional[str] = None,
+                           enable_reasoning: bool = False,
+                           use_cache: bool = True,
+                           skip_irrelevant: bool = True) -> Dict[str, Any]:
+    """
+    Same result as analyze_listing, but streams the completion and calls
+    on_phrase(phrase) for each risky_phrases entry as soon as it is complete.
+
+    If streaming fails (before or after content arrives), the regular
+    retry/fallback path is used and any phrases not yet shown are
+    reported at the end.
+    """
+    pre = prescan(listing, ordinance)
+    metrics.observe("prescan", pre["elapsed_ms"] / 1000)
+    if skip_irrelevant and not pre["pet_related"]:
+        metrics.incr("skipped_no_pet_content")
+        return _no_pet_content_result(listing, pre)
+
+    if not OPENROUTER_KEY:
+        return {"error": "OPENROUTER_API_KEY missing", **EMPTY_RESULT}
+
+    model = model or MODEL
+    key = _scan_cache_key(listing, ordinance, model, enable_reasoning)
+
+    if use_cache:
+        cached = _result_cache.get(key)
+        if cached is not None:
+            metrics.incr("cache_hits")
+            cached.setdefault("_meta", {})["cache"] = "hit"
+            for phrase in cached.get("risky_phrases", []):
+                on_phrase(phrase)
+            return cached
+        metrics.incr("cache_misses")
+
+    shown = set()
+
+    def show(phrase: Any) -> None:
+        if _phrase_key(phrase) not in shown:
+            shown.add(_phrase_key(phrase))
+            on_phrase(phrase)
+
+    def run() -> Dict[str, Any]:
+        with metrics.span("scan", model=model):
+            return stream()
+
+    def stream() -> Dict[str, Any]:
+        chunks = relevance.chunk_excerpts(listing)
+        if chunks:
+            return stream_chunks(chunks)
+        parser = RiskyPhraseStream()
+        parts = []
+        broken = False
+        try:
+            for delta in _stream_openrouter(_build_payload(listing, ordinance, model, enable_reasoning)):
+                parts.append(delta)
+                for phrase in parser.feed(delta):
+                    show(phrase)
+        except requests.RequestException:
+            broken = bool(parts)
+
+        if parts and not broken:
+            result = _parse_content("".join(parts), listing, ordinance, model)
+        else:
+            # Nothing arrived, or the stream died mid-answer: repairing the
+            # partial JSON would give a truncated fixed_listing, so redo the
+            # scan on the regular retry/fallback path.
+            if broken:
+                metrics.incr("stream_broken", model=model)
+            result = _analyze(listing, ordinance, model=model, enable_reasoning=enable_reasoning)
+        result.setdefault("_meta", {})["prescan"] = pre
+
+        if use_cache:
+            _store_result(key, result)
+        return result
+
+    def stream_chunks(chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Long listings are not streamed token by token; phrases are shown
+        # as each chunk finishes instead.
+        def show_partial(partial: Dict[str, Any]) -> None:
+            for phrase in partial.get("risky_phrases", []):
+                show(phrase)
+
+        result = _analyze_chunked(listing, ordinance, chunks, model=model,
+                                  enable_reasoning=enable_reasoning, on_result=show_partial)
+        result.setdefault("_meta", {})["prescan"] = pre
+        if use_cache:
+            _store_result(key, result)
+        return result
+
+    # Sessions that join another session's stream get all phrases at the end.
+    result, shared = _in_flight.do(key, run)
+    if shared:
+        metrics.incr("coalesced")
+        result.setdefault("_meta", {})["coalesced"] = True
+
+    # The enforcer, fallback or a retried scan may have produced phrases the stream never showed.
+    for phrase in result.get("risky_phrases", []):
+        show(phrase)
+    return result
+
+###########################################
+# MULTI-JURISDICTION ANALYSIS
+###########################################
+@profiled()
+def analyze_multi(listing: str, ordinances: Dict[str, str], *,
+                  model: Optional[str] = None,
+                  max_workers: int = MULTI_CITY_WORKERS,
+                  use_cache: bool = True) -> Dict[str, Dict[str, Any]]:
+    """
+    Scan one listing against several cities concurrently.
+
+    ordinances maps city -> ordinance text (see db.get_ordinance_contexts).
+    The prompt puts the listing before the ordinance, so every city's
+    request shares the same system + instructions + listing prefix and
+    providers with prompt caching only pay for it once.
+    """
+    if not ordinances:
+        return {}
+
+    # Listing-side checks are done once for all cities.
+    pre = prescan(listing, "")
+    if not pre["pet_related"]:
+        return {city: _no_pet_content_result(listing, prescan(listing, text))
+                for city, text in ordinances.items()}
+
+    def one(city: str) -> Dict[str, Any]:
+        return analyze_listing(listing, ordinances[city], model=model,
+                               use_cache=use_cache, skip_irrelevant=False)
+
+    cities = list(ordinances)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(cities)))) as pool:
+        return dict(zip(cities, pool.map(one, cities)))
+
+def phrase_matrix(results: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rows of {"phrase": ..., <city>: bool, ...} showing where each phrase was flagged."""
+    cities = list(results)
+    rows: Dict[str, Dict[str, Any]] = {}
+    for city in cities:
+        for phrase in results[city].get("risky_phrases", []):
+            label = phrase if isinstance(phrase, str) else json.dumps(phrase, ensure_ascii=False)
+            row = rows.setdefault(_phrase_key(phrase), {"phrase": label, **{c: False for c in cities}})
+            row[city] = True
+    return sorted(rows.values(), key=lambda r: -sum(r[c] for c in cities))
@@ -0,0 +1,331 @@
+# utils/llm_async.py
+import asyncio
+import json
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from utils import llm, metrics, relevance
+from utils.health import get_health, is_failure_status
+from utils.http import POOL_MAXSIZE
+from utils.ratelimit import MAX_QUEUE_WAIT, RATE_LIMIT_DB, limiter_for
+from utils.rules import prescan
+
+# Upper bound on OpenRouter requests in flight across the whole process.
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 64))
+
+
+def _wake(waiter: "asyncio.Future[None]") -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class _ProcessSlots:
+    """
+    Counting semaphore shared by every event loop in the process
+    (asyncio.Semaphore is bound to one loop). Waiters are served FIFO; a
+    released slot is handed straight to the next waiter, on its own loop.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._lock = threading.Lock()
+        self._used = 0
+        self._waiters: deque = deque()  # [loop, future, granted]
+
+    async def __aenter__(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._used < self.limit and not self._waiters:
+                self._used += 1
+                return
+            entry = [loop, loop.create_future(), False]
+            self._waiters.append(entry)
+        try:
+            await entry[1]
+        except BaseException:
+            with self._lock:
+                granted = entry[2]
+                if not granted:
+                    self._waiters.remove(entry)
+            if granted:
+                self._release()  # cancelled after the slot was handed over
+            raise
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self._release()
+
+    def _release(self) -> None:
+        with self._lock:
+            if not self._waiters:
+                self._used -= 1
+                return
+            entry = self._waiters.popleft()
+            entry[2] = True
+        try:
+            entry[0].call_soon_threadsafe(_wake, entry[1])
+        except RuntimeError:
+            self._release()  # that waiter's loop is closed: pass the slot on
+
+
+_slots = _ProcessSlots(MAX_CONCURRENCY)
+
+# httpx clients are bound to the loop that first uses them, and Streamlit
+# may run asyncio.run() from many script threads, so each loop gets its
+# own client; the in-flight bound (_slots) is shared by all of them.
+_loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _loop_clients.get(loop)
+    if client is None:
+        limits = httpx.Limits(
+            max_connections=max(MAX_CONCURRENCY, POOL_MAXSIZE),
+            max_keepalive_connections=POOL_MAXSIZE,
+        )
+        client = _loop_clients[loop] = httpx.AsyncClient(limits=limits)
+    return client
+
+
+async def _limiter_call(fn: Any, *args: Any) -> Any:
+    # The SQLite-backed limiter does blocking I/O (BEGIN IMMEDIATE may wait
+    # on another process); keep it off the event loop.
+    if RATE_LIMIT_DB:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+async def aclose() -> None:
+    """Close the client bound to the running loop (call before the loop ends)."""
+    client = _loop_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def call_openrouter_async(payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Async twin of llm._call_openrouter.
+
+    A process-wide slot is only held while a request is on the wire, so
+    tasks sleeping through backoff or a rate-limit queue do not starve the
+    others. Cancellation propagates as asyncio.CancelledError.
+    """
+    client = _client()
+    headers = llm._headers()
+    model = payload.get("model", "")
+    health = get_health(model)
+    limiter = limiter_for(model)
+    queued = 0.0
+    for attempt in range(1, llm.MAX_RETRIES + 1):
+        # Fail fast on an open breaker before taking a rate-limit slot.
+        if not health.available():
+            metrics.incr("circuit_open", model=model)
+            return {"error": f"circuit_open: {payload.get('model')}"}
+        # Same shared budget as the sync path; slots are reserved in FIFO order.
+        waited = await _limiter_call(limiter.reserve)
+        if waited is None:
+            return {"error": f"rate_limited: queue wait over {MAX_QUEUE_WAIT:.0f}s"}
+        if waited > 0:
+            metrics.observe("queue_wait", waited, model=model)
+            await asyncio.sleep(waited)
+        queued += waited
+        # Re-checked after the wait: the breaker may have opened meanwhile.
+        if not health.allow():
+            metrics.incr("circuit_open", model=model)
+            return {"error": f"circuit_open: {payload.get('model')}"}
+        started = time.monotonic()
+        try:
+            async with _slots:
+                resp = await client.post(llm.OPENROUTER_URL, headers=headers, json=payload,
+                                         timeout=timeout or health.timeout(llm.TIMEOUT))
+            await _limiter_call(limiter.observe, resp.headers, resp.status_code)
+            resp.raise_for_status()
+            data = resp.json()
+            elapsed = time.monotonic() - started
+            health.record(True, elapsed)
+            metrics.observe("llm_call", elapsed, model=model)
+            metrics.record_usage(model, data.get("usage"))
+            data["_queue_wait"] = queued
+            return data
+        except (httpx.HTTPError, ValueError) as e:
+            status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+            health.record(not is_failure_status(status))
+            metrics.observe("llm_call", time.monotonic() - started, model=model, error=status or "transport")
+            if attempt == llm.MAX_RETRIES:
+                return {"error": str(e)}
+            metrics.incr("retries", model=model, status=status or "transport")
+            if status == 429:
+                continue
+        except BaseException:
+            # Cancelled (a hedge was won elsewhere) or interrupted mid-request.
+            health.release_probe()
+            raise
+        await asyncio.sleep(llm.BACKOFF_FACTOR ** attempt)
+    return {"error": "unknown_error"}
+
+
+async def enforce_json_structure_async(bad_output: str) -> dict:
+    metrics.incr("enforcer_calls")
+    with metrics.span("enforcer"):
+        resp = await call_openrouter_async(llm._enforcer_payload(bad_output))
+    try:
+        txt = resp["choices"][0]["message"]["content"]
+        parsed = json.loads(txt)
+        return parsed if llm._is_answer(parsed) else dict(llm.EMPTY_RESULT)
+    except Exception:
+        return dict(llm.EMPTY_RESULT)
+
+
+async def _attempt_async(listing: str, ordinance: str, model: str,
+                         enable_reasoning: bool = False,
+                         excerpt: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """One model, no fallback. Returns a finalized result or an error dict."""
+    payload = llm._build_payload(listing, ordinance, model, enable_reasoning, excerpt)
+    response = await call_openrouter_async(payload)
+
+    if "error" in response:
+        return {"error": response["error"], **llm.EMPTY_RESULT}
+
+    try:
+        content = response["choices"][0]["message"]["content"]
+        with metrics.span("parse"):
+            parsed = llm._safe_load_json(content)
+        if llm._needs_enforcer(parsed):
+            parsed = await enforce_json_structure_async(content)
+        choice = response["choices"][0]
+        result = llm._finalize(parsed, content, listing, model, excerpt,
+                               truncated=choice.get("finish_reason") == "length")
+        result["_meta"]["queue_wait"] = round(response.get("_queue_wait", 0.0), 3)
+        return result
+    except Exception as e:
+        return {"error": f"parse_error: {str(e)}", **llm.EMPTY_RESULT}
+
+
+async def _analyze_async(listing: str, ordinance: str, *, model: str,
+                         enable_reasoning: bool = False,
+                         excerpt: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    if llm.HEDGE_ENABLED and model != llm.MODEL_FALLBACK:
+        return await _analyze_hedged_async(listing, ordinance, model=model, enable_reasoning=enable_reasoning,
+                                           excerpt=excerpt)
+
+    result = await _attempt_async(listing, ordinance, model, enable_reasoning, excerpt)
+    if "error" in result and model != llm.MODEL_FALLBACK:
+        return await _fallback_async(listing, ordinance, excerpt)
+    return result
+
+
+async def _fallback_async(listing: str, ordinance: str,
+                          excerpt: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    metrics.incr("fallbacks")
+    with metrics.span("fallback", model=llm.MODEL_FALLBACK):
+        return await _attempt_async(listing, ordinance, llm.MODEL_FALLBACK, excerpt=excerpt)
+
+
+async def _analyze_hedged_async(listing: str, ordinance: str, *, model: str,
+                                enable_reasoning: bool = False,
+                                excerpt: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Async twin of llm._analyze_hedged; the losing request is truly cancelled."""
+    primary = asyncio.ensure_future(_attempt_async(listing, ordinance, model, enable_reasoning, excerpt))
+    fallback = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=llm.hedge_delay(model))
+        if done:
+            result = primary.result()
+            if "error" not in result:
+                return result
+            return await _fallback_async(listing, ordinance, excerpt)
+
+        metrics.incr("hedges", model=model)
+        fallback = asyncio.ensure_future(_attempt_async(listing, ordinance, llm.MODEL_FALLBACK, excerpt=excerpt))
+        pending = {primary, fallback}
+        result = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if "error" not in result:
+                    metrics.incr("hedge_wins", winner="fallback" if task is fallback else "primary")
+                    result["_meta"]["hedged"] = True
+                    return result
+        return result
+    finally:
+        for task in (primary, fallback):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+async def _analyze_chunked_async(listing: str, ordinance: str, chunks: List[Dict[str, Any]], *,
+                                 model: str, enable_reasoning: bool = False) -> Dict[str, Any]:
+    """Async twin of llm._analyze_chunked: at most CHUNK_WORKERS chunks in flight."""
+    metrics.incr("chunked_scans")
+    slots = asyncio.Semaphore(max(1, llm.CHUNK_WORKERS))
+
+    async def one(excerpt: Dict[str, Any]) -> Dict[str, Any]:
+        async with slots:
+            with metrics.span("chunk", model=model):
+                return await _analyze_async(listing, ordinance, model=model,
+                                            enable_reasoning=enable_reasoning, excerpt=excerpt)
+
+    results = await asyncio.gather(*(one(excerpt) for excerpt in chunks))
+    return llm._merge_chunks(listing, chunks, list(results))
+
+
+async def _scan_async(listing: str, ordinance: str, *, model: str, enable_reasoning: bool) -> Dict[str, Any]:
+    chunks = relevance.chunk_excerpts(listing)
+    with metrics.span("scan", model=model):
+        if chunks:
+            return await _analyze_chunked_async(listing, ordinance, chunks, model=model,
+                                                enable_reasoning=enable_reasoning)
+        return await _analyze_async(listing, ordinance, model=model, enable_reasoning=enable_reasoning)
+
+
+async def analyze_listing_async(listing: str, ordinance: str, *,
+                                model: Optional[str] = None,
+                                enable_reasoning: bool = False,
+                                use_cache: bool = True,
+                                skip_irrelevant: bool = True) -> Dict[str, Any]:
+    """
+    Non-blocking analyze_listing. Shares the result cache and in-flight
+    coalescing with the sync path, so identical concurrent scans (sync or
+    async, on any loop) pay for one model call.
+    """
+    pre = prescan(listing, ordinance)
+    metrics.observe("prescan", pre["elapsed_ms"] / 1000)
+    if skip_irrelevant and not pre["pet_related"]:
+        metrics.incr("skipped_no_pet_content")
+        return llm._no_pet_content_result(listing, pre)
+
+    if not llm.OPENROUTER_KEY:
+        return {"error": "OPENROUTER_API_KEY missing", **llm.EMPTY_RESULT}
+
+    model = model or llm.MODEL
+    key = llm._scan_cache_key(listing, ordinance, model, enable_reasoning)
+
+    if use_cache:
+        cached = llm._result_cache.get(key)
+        if cached is not None:
+            metrics.incr("cache_hits")
+            cached.setdefault("_meta", {})["cache"] = "hit"
+            return cached
+        metrics.incr("cache_misses")
+
+    async def run() -> Dict[str, Any]:
+        result = await _scan_async(listing, ordinance, model=model, enable_reasoning=enable_reasoning)
+        result.setdefault("_meta", {})["prescan"] = pre
+        if use_cache:
+            llm._store_result(key, result)
+        return result
+
+    result, shared = await llm._in_flight.do_async(key, run)
+    if shared:
+        metrics.incr("coalesced")
+        result.setdefault("_meta", {})["coalesced"] = True
+    return result
@@ -0,0 +1,137 @@
+# utils/metrics.py
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Latency samples kept per (stage, labels) series for quantiles.
+METRICS_SAMPLES = int(os.getenv("METRICS_SAMPLES", 2048))
+METRICS_PREFIX = "petclause"
+QUANTILES = (0.5, 0.9, 0.99)
+
+_Series = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_lock = threading.Lock()
+_timings: Dict[_Series, Dict[str, Any]] = {}
+_counters: Dict[_Series, float] = {}
+
+
+def _series(name: str, labels: Dict[str, Any]) -> _Series:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def observe(stage: str, seconds: float, **labels: Any) -> None:
+    """Record one duration for a stage (db, llm_call, parse, enforcer, fallback, pdf, ...)."""
+    key = _series(stage, labels)
+    with _lock:
+        t = _timings.get(key)
+        if t is None:
+            t = _timings[key] = {"count": 0, "sum": 0.0, "samples": deque(maxlen=METRICS_SAMPLES)}
+        t["count"] += 1
+        t["sum"] += seconds
+        t["samples"].append(seconds)
+
+
+@contextmanager
+def span(stage: str, **labels: Any) -> Iterator[None]:
+    """Time the enclosed block as `stage`; failures are timed too, with error="1"."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        observe(stage, time.perf_counter() - started, error="1", **labels)
+        raise
+    observe(stage, time.perf_counter() - started, **labels)
+
+
+def incr(name: str, n: float = 1, **labels: Any) -> None:
+    """Bump a counter (retries, fallbacks, enforcer_calls, cache_hits, ...)."""
+    key = _series(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def record_usage(model: Optional[str], usage: Optional[Dict[str, Any]]) -> None:
+    """Token counts from an OpenRouter response's `usage` field."""
+    if not isinstance(usage, dict):
+        return
+    for kind in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = usage.get(kind)
+        if isinstance(value, (int, float)):
+            incr("tokens", value, model=model, kind=kind[:-len("_tokens")])
+    cost = usage.get("cost")
+    if isinstance(cost, (int, float)):
+        incr("cost_usd", cost, model=model)
+
+
+def _quantile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def snapshot() -> Dict[str, Any]:
+    """JSON-friendly view: per-stage count/sum/p50/p90/p99 and all counters."""
+    with _lock:
+        timings = [(k, v["count"], v["sum"], list(v["samples"])) for k, v in _timings.items()]
+        counters = list(_counters.items())
+    stages = []
+    for (stage, labels), count, total, samples in sorted(timings):
+        entry = {"stage": stage, "labels": dict(labels), "count": count, "sum": round(total, 6)}
+        for q in QUANTILES:
+            entry[f"p{int(q * 100)}"] = round(_quantile(samples, q), 6) if samples else None
+        stages.append(entry)
+    return {
+        "stages": stages,
+        "counters": [{"name": name, "labels": dict(labels), "value": value}
+                     for (name, labels), value in sorted(counters)],
+    }
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def prometheus_text() -> str:
+    """Prometheus text exposition (stage latencies as summaries, counters as *_total)."""
+    snap = snapshot()
+    lines = [f"# HELP {METRICS_PREFIX}_stage_seconds Time spent per pipeline stage.",
+             f"# TYPE {METRICS_PREFIX}_stage_seconds summary"]
+    for s in snap["stages"]:
+        labels = (("stage", s["stage"]),) + tuple(s["labels"].items())
+        for q in QUANTILES:
+            value = s[f"p{int(q * 100)}"]
+            if value is not None:
+                lines.append(f"{METRICS_PREFIX}_stage_seconds{_label_str(labels, (('quantile', str(q)),))} {value}")
+        lines.append(f"{METRICS_PREFIX}_stage_seconds_sum{_label_str(labels)} {s['sum']}")
+        lines.append(f"{METRICS_PREFIX}_stage_seconds_count{_label_str(labels)} {s['count']}")
+
+    seen = set()
+    for c in snap["counters"]:
+        name = f"{METRICS_PREFIX}_{c['name']}_total"
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_label_str(tuple(c['labels'].items()))} {c['value']}")
+    return "\n".join(lines) + "\n"
+
+
+def dump(path: str) -> None:
+    """Write snapshot() as JSON (for CLI runs that have no metrics endpoint)."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+
+
+def reset() -> None:
+    with _lock:
+        _timings.clear()
+        _counters.clear()
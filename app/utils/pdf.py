@@ -5,9 +5,69 @@ from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from datetime import datetime
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+import os
+import threading
 import uuid
 
+from utils import metrics
+from utils.cache import make_key
+from utils.profiling import profiled
 
+# Rendered reports kept in memory, keyed by a hash of their content.
+PDF_CACHE_ENTRIES = int(os.getenv("PDF_CACHE_ENTRIES", 64))
+
+_pdf_cache = OrderedDict()
+_pdf_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _styles():
+    """Paragraph styles, built once per process instead of once per report."""
+    styles = getSampleStyleSheet()
+
+    # Custom style overrides for legal format
+    h1 = ParagraphStyle(
+        "Heading1",
+        parent=styles["Heading1"],
+        fontSize=18,
+        spaceAfter=10
+    )
+    h2 = ParagraphStyle(
+        "Heading2",
+        parent=styles["Heading2"],
+        fontSize=14,
+        spaceAfter=8
+    )
+    body = ParagraphStyle(
+        "Body",
+        parent=styles["BodyText"],
+        fontSize=11,
+        leading=15
+    )
+    return h1, h2, body
+
+
+@lru_cache(maxsize=None)
+def _title_table_style():
+    return TableStyle([
+        ("BACKGROUND", (0, 0), (0, 0), colors.HexColor("#1f2937")),
+        ("TEXTCOLOR", (0, 0), (0, 0), colors.white),
+        ("FONTNAME", (0, 0), (0, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (0, 0), 16),
+        ("ALIGN", (0, 0), (0, -1), "LEFT"),
+        ("BOTTOMPADDING", (0, 0), (0, 0), 12),
+        ("TOPPADDING", (0, 0), (0, 0), 12),
+        ("BACKGROUND", (0, 1), (0, -1), colors.HexColor("#f3f4f6")),
+        ("FONTSIZE", (0, 1), (0, -1), 10),
+        ("FONTNAME", (0, 1), (0, -1), "Helvetica"),
+        ("TEXTCOLOR", (0, 1), (0, -1), colors.black),
+    ])
+
+
+@profiled()
 def create_pdf(
     path,
     listing,
@@ -15,20 +75,24 @@ def create_pdf(
     risky,
     citations,
     city=None,
-    version="1.0.0"
+    version="1.0.0",
+    doc_id=None
 ):
     """
     Generate a professional, legal-style PDF report.
 
     This version is formatted for attorneys, compliance teams,
     and regulatory filings. Court-readable and audit-friendly.
+
+    If path is None the PDF is rendered in memory and returned as bytes.
     """
+    buffer = BytesIO() if path is None else None
 
     # ---------------------------
     # DOCUMENT TEMPLATE
     # ---------------------------
     doc = SimpleDocTemplate(
-        path,
+        buffer if buffer is not None else path,
         pagesize=letter,
         title="PetClause AI Compliance Report",
         author="PetClause AI",
@@ -38,34 +102,14 @@ def create_pdf(
         bottomMargin=50
     )
 
-    styles = getSampleStyleSheet()
-
-    # Custom style overrides for legal format
-    h1 = ParagraphStyle(
-        "Heading1",
-        parent=styles["Heading1"],
-        fontSize=18,
-        spaceAfter=10
-    )
-    h2 = ParagraphStyle(
-        "Heading2",
-        parent=styles["Heading2"],
-        fontSize=14,
-        spaceAfter=8
-    )
-    body = ParagraphStyle(
-        "Body",
-        parent=styles["BodyText"],
-        fontSize=11,
-        leading=15
-    )
+    h1, h2, body = _styles()
 
     content = []
 
     # ---------------------------
     # TITLE PAGE
     # ---------------------------
-    doc_id = uuid.uuid4().hex[:10].upper()
+    doc_id = (doc_id or uuid.uuid4().hex)[:10].upper()
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
 
     title_data = [
@@ -77,19 +121,7 @@ def create_pdf(
     ]
 
     table = Table(title_data, colWidths=[450])
-    table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (0, 0), colors.HexColor("#1f2937")),
-        ("TEXTCOLOR", (0, 0), (0, 0), colors.white),
-        ("FONTNAME", (0, 0), (0, 0), "Helvetica-Bold"),
-        ("FONTSIZE", (0, 0), (0, 0), 16),
-        ("ALIGN", (0, 0), (0, -1), "LEFT"),
-        ("BOTTOMPADDING", (0, 0), (0, 0), 12),
-        ("TOPPADDING", (0, 0), (0, 0), 12),
-        ("BACKGROUND", (0, 1), (0, -1), colors.HexColor("#f3f4f6")),
-        ("FONTSIZE", (0, 1), (0, -1), 10),
-        ("FONTNAME", (0, 1), (0, -1), "Helvetica"),
-        ("TEXTCOLOR", (0, 1), (0, -1), colors.black),
-    ]))
+    table.setStyle(_title_table_style())
     content.append(table)
     content.append(Spacer(1, 20))
 
@@ -153,3 +185,45 @@ def create_pdf(
     # BUILD PDF
     # ---------------------------
     doc.build(content)
+
+    if buffer is not None:
+        return buffer.getvalue()
+    return None
+
+
+def report_id(listing, fixed, risky, citations, city=None, version="1.0.0"):
+    """Content hash of a report; also used as its Document ID."""
+    return make_key(listing=listing, fixed=fixed, risky=list(risky or []),
+                    citations=list(citations or []), city=city, version=version)
+
+
+def render_pdf_bytes(listing, fixed, risky, citations, city=None, version="1.0.0"):
+    """
+    In-memory PDF for a scan result, built once per distinct result.
+
+    Streamlit reruns the script on every interaction; with this cache a
+    rerun of the paid view costs a dict lookup instead of a ReportLab build.
+    """
+    key = report_id(listing, fixed, risky, citations, city, version)
+    with _pdf_cache_lock:
+        if key in _pdf_cache:
+            _pdf_cache.move_to_end(key)
+            metrics.incr("pdf_cache_hits")
+            return _pdf_cache[key]
+
+    # Imported here: pdf_service imports this module for its workers.
+    from utils.pdf_service import get_service
+    # Timed from the caller's side: renders run in worker processes whose
+    # metrics would never reach this process.
+    with metrics.span("pdf"):
+        data = get_service().render({
+            "listing": listing, "fixed": fixed, "risky": list(risky or []),
+            "citations": list(citations or []), "city": city, "version": version, "doc_id": key,
+        })
+
+    with _pdf_cache_lock:
+        _pdf_cache[key] = data
+        _pdf_cache.move_to_end(key)
+        while len(_pdf_cache) > PDF_CACHE_ENTRIES:
+            _pdf_cache.popitem(last=False)
+    return data
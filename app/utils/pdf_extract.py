@@ -0,0 +1,299 @@
+# utils/pdf_extract.py
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from PyPDF2 import PdfReader
+from PyPDF2.errors import PdfReadError
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+from utils import metrics
+
+PDF_UPLOAD_MAX_BYTES = int(os.getenv("PDF_UPLOAD_MAX_BYTES", 15 * 1024 * 1024))
+# Pages past this are not extracted; the result is marked truncated.
+PDF_UPLOAD_MAX_PAGES = int(os.getenv("PDF_UPLOAD_MAX_PAGES", 150))
+# Text extraction is pure Python and CPU-bound (threads only contend for
+# the GIL), so large documents are split across worker processes in
+# batches of pages. 0 workers extracts everything in the calling thread.
+_CPUS = os.cpu_count() or 1
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", min(4, _CPUS) if _CPUS > 1 else 0))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 40))
+PDF_EXTRACT_BATCH = int(os.getenv("PDF_EXTRACT_BATCH", 10))
+PDF_PAGE_CACHE_ENTRIES = int(os.getenv("PDF_PAGE_CACHE_ENTRIES", 2048))
+
+# page content hash -> extracted text (lease templates share most pages)
+_page_cache: "OrderedDict[str, str]" = OrderedDict()
+_page_cache_lock = threading.Lock()
+
+Source = Union[bytes, bytearray, memoryview, io.BytesIO]
+
+
+class PdfRejected(ValueError):
+    """The upload is not a readable PDF or exceeds PDF_UPLOAD_MAX_BYTES."""
+
+
+class _MemoryStream(io.RawIOBase):
+    """
+    Read-only, seekable file over a memoryview. Each reader gets its own
+    position but shares the caller's buffer, so the document is never copied.
+    """
+
+    def __init__(self, buf: memoryview):
+        super().__init__()
+        self._buf = buf
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._buf) - self._pos))
+        b[:n] = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._buf)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def _as_buffer(source: Source) -> memoryview:
+    # BytesIO (and Streamlit's UploadedFile) expose their buffer without a copy.
+    if isinstance(source, io.BytesIO):
+        return source.getbuffer()
+    return memoryview(source)
+
+
+def _open(buf: memoryview) -> PdfReader:
+    try:
+        reader = PdfReader(_MemoryStream(buf))
+        if reader.is_encrypted and not reader.decrypt(""):
+            raise PdfRejected("This PDF is password-protected.")
+        return reader
+    except PdfRejected:
+        raise
+    except (PdfReadError, ValueError, KeyError, TypeError) as e:
+        raise PdfRejected(f"Could not read this PDF ({e}).") from e
+
+
+###########################################
+# PER-PAGE CACHE
+###########################################
+# Keys that point back up the page tree; following them would hash the
+# whole document into every page.
+_SKIP_KEYS = {"/Parent", "/P", "/Annots", "/B", "/Thumb"}
+
+
+def _hash_object(obj: Any, digest: Any, seen: Dict[Tuple[int, int], int]) -> None:
+    """
+    Feed a resolved PDF object into digest: dictionaries (sorted), arrays,
+    stream data and scalars. Indirect objects are hashed once per page and
+    then referred to by first-visit order, which is the same for identical
+    pages from different files.
+    """
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref in seen:
+            digest.update(b"@%d" % seen[ref])
+            return
+        seen[ref] = len(seen)
+        obj = obj.get_object()
+    if isinstance(obj, StreamObject):
+        digest.update(b"S")
+        digest.update(obj.get_data())
+    if isinstance(obj, DictionaryObject):
+        digest.update(b"{")
+        for name in sorted(obj.keys()):
+            if name in _SKIP_KEYS:
+                continue
+            digest.update(str(name).encode("utf-8"))
+            _hash_object(obj.raw_get(name), digest, seen)
+        digest.update(b"}")
+    elif isinstance(obj, ArrayObject):
+        digest.update(b"[")
+        for item in obj:
+            _hash_object(item, digest, seen)
+        digest.update(b"]")
+    else:
+        digest.update(repr(obj).encode("utf-8"))
+
+
+def _page_key(page: Any) -> Optional[str]:
+    """
+    Hash of everything extract_text() reads for the page: its content
+    stream, rotation and the fully resolved resources (fonts, form and
+    image XObjects and their own resources). Pages that draw through
+    "/Fx Do" differ only in their XObjects, so those have to be included.
+    """
+    try:
+        digest = hashlib.sha256()
+        seen: Dict[Tuple[int, int], int] = {}
+        contents = page.get_contents()
+        digest.update(contents.get_data() if contents is not None else b"")
+        digest.update(repr(page.get("/Rotate", 0)).encode("utf-8"))
+        if "/Resources" in page:
+            _hash_object(page.raw_get("/Resources"), digest, seen)
+        return digest.hexdigest()
+    except Exception:
+        return None  # unusual page structure: extract without caching
+
+
+def _cached(key: Optional[str]) -> Optional[str]:
+    if key is None:
+        return None
+    with _page_cache_lock:
+        if key in _page_cache:
+            _page_cache.move_to_end(key)
+            metrics.incr("pdf_page_cache_hits")
+            return _page_cache[key]
+    return None
+
+
+def _remember(key: Optional[str], text: str) -> None:
+    if key is None:
+        return
+    with _page_cache_lock:
+        _page_cache[key] = text
+        _page_cache.move_to_end(key)
+        while len(_page_cache) > PDF_PAGE_CACHE_ENTRIES:
+            _page_cache.popitem(last=False)
+
+
+def _extract_page(page: Any) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        return ""  # one broken page should not lose the rest of the lease
+
+
+###########################################
+# EXTRACTION
+###########################################
+def _extract_batch(path: str, indices: List[int]) -> List[str]:
+    # Runs in a worker process. A file handle (not a path) keeps PdfReader
+    # from loading the whole file: it only seeks to the objects it needs.
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        if reader.is_encrypted:
+            reader.decrypt("")
+        return [_extract_page(reader.pages[i]) for i in indices]
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Process-wide extraction pool, started on first large document ("spawn", as in pdf_service)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def iter_pages(source: Source, max_pages: int = PDF_UPLOAD_MAX_PAGES,
+               workers: int = PDF_EXTRACT_WORKERS) -> Iterator[Tuple[int, int, str]]:
+    """
+    Yield (page_number, page_count, text) in page order as pages are extracted.
+
+    Cached pages (by content hash) are never re-extracted. Large documents
+    send the rest to the worker pool in batches, at most `workers * 2`
+    batches in flight; workers read the upload from a temporary file rather
+    than a pickled copy. Raises PdfRejected for oversized or unreadable files.
+    """
+    buf = _as_buffer(source)
+    if len(buf) > PDF_UPLOAD_MAX_BYTES:
+        raise PdfRejected(f"PDF is larger than {PDF_UPLOAD_MAX_BYTES // (1024 * 1024)} MB.")
+    reader = _open(buf)
+    total = len(reader.pages)
+    count = min(total, max_pages)
+    keys = [_page_key(reader.pages[i]) for i in range(count)]
+    known: Dict[int, str] = {}
+    for i in range(count):
+        text = _cached(keys[i])
+        if text is not None:
+            known[i] = text
+    todo = [i for i in range(count) if i not in known]
+
+    if workers <= 0 or len(todo) < PDF_PARALLEL_MIN_PAGES:
+        for i in range(count):
+            text = known.get(i)
+            if text is None:
+                text = _extract_page(reader.pages[i])
+                _remember(keys[i], text)
+            yield i + 1, total, text
+        return
+
+    fd, path = tempfile.mkstemp(prefix="petclause-upload-", suffix=".pdf")
+    in_flight: deque = deque()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(buf)  # written straight from the upload's buffer
+        pool = _get_pool(workers)
+        batches = iter([todo[n:n + PDF_EXTRACT_BATCH] for n in range(0, len(todo), PDF_EXTRACT_BATCH)])
+
+        def fill() -> None:
+            while len(in_flight) < max(1, workers * 2):
+                batch = next(batches, None)
+                if batch is None:
+                    return
+                in_flight.append((batch, pool.submit(_extract_batch, path, batch)))
+
+        fill()
+        for i in range(count):
+            while i not in known:
+                batch, fut = in_flight.popleft()
+                for index, text in zip(batch, fut.result()):
+                    known[index] = text
+                    _remember(keys[index], text)
+                fill()
+            yield i + 1, total, known.pop(i)
+    finally:
+        for _, fut in in_flight:
+            fut.cancel()  # the caller stopped early
+        os.unlink(path)
+
+
+def extract_text(source: Source, *, max_pages: int = PDF_UPLOAD_MAX_PAGES,
+                 on_page: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Text of a PDF lease or listing, ready for the scan pipeline.
+
+    Returns {"text", "pages", "total_pages", "truncated", "elapsed_ms"};
+    on_page(done, count) is called after each page, in the caller's thread.
+    """
+    t0 = time.perf_counter()
+    parts = []
+    total = 0
+    with metrics.span("pdf_extract"):
+        for number, total, text in iter_pages(source, max_pages=max_pages):
+            if text.strip():
+                parts.append(text.strip())
+            if on_page is not None:
+                on_page(number, min(total, max_pages))
+    pages = min(total, max_pages)
+    metrics.incr("pdf_pages_extracted", pages)
+    return {
+        "text": "\n\n".join(parts),
+        "pages": pages,
+        "total_pages": total,
+        "truncated": total > max_pages,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
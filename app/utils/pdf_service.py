@@ -0,0 +1,134 @@
+# utils/pdf_service.py
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from PyPDF2 import PdfMerger
+
+from utils import metrics, pdf
+
+# ReportLab is pure Python and CPU-bound, so reports are built in worker
+# processes. 0 disables the pool and renders in the calling thread, which
+# is also the default on single-core hosts where a pool only adds IPC.
+_CPUS = os.cpu_count() or 1
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", min(4, _CPUS) if _CPUS > 1 else 0))
+# Jobs submitted but not yet finished; submit() blocks beyond this.
+PDF_QUEUE_SIZE = int(os.getenv("PDF_QUEUE_SIZE", 64))
+PDF_SUBMIT_TIMEOUT = float(os.getenv("PDF_SUBMIT_TIMEOUT", 30))
+
+
+class PdfQueueFull(RuntimeError):
+    """Raised when the job queue stays full for longer than the submit timeout."""
+
+
+def _warm_worker() -> None:
+    # Styles are compiled once per worker, not once per report.
+    pdf._styles()
+    pdf._title_table_style()
+
+
+def _render(job: Dict[str, Any]) -> bytes:
+    return pdf.create_pdf(None, **job)
+
+
+def make_job(listing: str, result: Dict[str, Any], city: Optional[str] = None) -> Dict[str, Any]:
+    """Job dict for a scan result, in create_pdf's keyword arguments."""
+    job = {
+        "listing": listing,
+        "fixed": result.get("fixed_listing") or "",
+        "risky": [str(p) for p in result.get("risky_phrases", [])],
+        "citations": [str(c) for c in result.get("citations", [])],
+        "city": city,
+    }
+    job["doc_id"] = pdf.report_id(job["listing"], job["fixed"], job["risky"], job["citations"], city)
+    return job
+
+
+class PdfService:
+    """
+    Process-pool PDF renderer with a bounded job queue.
+
+    Workers are started with the "spawn" method: the Streamlit server is
+    multi-threaded, and forking a threaded process is unsafe.
+    """
+
+    def __init__(self, workers: int = PDF_WORKERS, queue_size: int = PDF_QUEUE_SIZE):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._pool = None
+        if workers > 0:
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+            )
+
+    def submit(self, job: Dict[str, Any], timeout: float = PDF_SUBMIT_TIMEOUT) -> "Future[bytes]":
+        if self._pool is None:
+            fut: "Future[bytes]" = Future()
+            try:
+                fut.set_result(_render(job))
+            except Exception as e:
+                fut.set_exception(e)
+            return fut
+        if not self._slots.acquire(timeout=timeout):
+            raise PdfQueueFull(f"PDF queue full ({PDF_QUEUE_SIZE} jobs pending)")
+        fut = self._pool.submit(_render, job)
+        fut.add_done_callback(lambda _: self._slots.release())
+        return fut
+
+    def render(self, job: Dict[str, Any]) -> bytes:
+        return self.submit(job).result()
+
+    def render_many(self, jobs: Iterable[Dict[str, Any]], window: Optional[int] = None) -> Iterator[bytes]:
+        """Render jobs in parallel, yielding PDFs in input order with at most `window` in flight."""
+        window = window or max(self.workers * 2, 1)
+        in_flight: deque = deque()
+        for job in jobs:
+            in_flight.append(self.submit(job))
+            if len(in_flight) >= window:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+    def render_portfolio(self, jobs: Iterable[Dict[str, Any]]) -> bytes:
+        """One merged PDF for many scan results, with a bookmark per report."""
+        labels: deque = deque()
+
+        def tracked() -> Iterator[Dict[str, Any]]:
+            for job in jobs:
+                labels.append(f"{job.get('city') or 'N/A'} — {str(job.get('doc_id') or '')[:10].upper()}")
+                yield job
+
+        merger = PdfMerger()
+        try:
+            with metrics.span("pdf_portfolio"):
+                for data in self.render_many(tracked()):
+                    merger.append(BytesIO(data), outline_item=labels.popleft())
+                out = BytesIO()
+                merger.write(out)
+                return out.getvalue()
+        finally:
+            merger.close()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+_service: Optional[PdfService] = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> PdfService:
+    """Process-wide PDF service, started on first use."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = PdfService()
+    return _service
@@ -0,0 +1,193 @@
+# utils/profiling.py
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional
+
+# Off unless PROFILE=1 (every process, sampled) or forced for one request
+# via forced(), e.g. by an operator's ?profile=<PROFILE_TOKEN> in the app.
+PROFILE_ENABLED = os.getenv("PROFILE", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.05))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Empty token disables the query-parameter switch entirely.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000
+PROFILE_TOP_ALLOCS = int(os.getenv("PROFILE_TOP_ALLOCS", 25))
+
+_forced: ContextVar[bool] = ContextVar("profiling_forced", default=False)
+# tracemalloc and the thread-start hook are process-wide: one profiled
+# call at a time, concurrent calls run unprofiled rather than queueing.
+_busy = threading.Lock()
+
+
+@contextmanager
+def forced(enabled: bool = True) -> Iterator[None]:
+    """Profile every @profiled call made inside this block (same thread/context)."""
+    token = _forced.set(enabled)
+    try:
+        yield
+    finally:
+        _forced.reset(token)
+
+
+def token_ok(value: Optional[str]) -> bool:
+    return bool(PROFILE_TOKEN) and value == PROFILE_TOKEN
+
+
+class _Threads:
+    """
+    The profiled call's threads: the caller, plus every thread started
+    while it runs (hedge, chunk and analyze_multi pools are created per
+    call), each under its own cProfile. Installed with threading.setprofile.
+    """
+
+    def __init__(self, caller: int):
+        self.idents = {caller}
+        self.profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def hook(self, frame: Any, event: str, arg: Any) -> None:
+        # First profile event in a new thread: swap this hook for cProfile.
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        with self._lock:
+            self.idents.add(threading.get_ident())
+            self.profilers.append(profiler)
+        profiler.enable()
+
+    def stats(self, main: cProfile.Profile, stream: io.StringIO) -> pstats.Stats:
+        stats = pstats.Stats(main, stream=stream)
+        with self._lock:
+            profilers = list(self.profilers)
+        for profiler in profilers:
+            stats.add(profiler)
+        return stats
+
+
+class _StackSampler(threading.Thread):
+    """Samples the profiled threads' Python stacks every `interval` seconds into collapsed-stack counts."""
+
+    def __init__(self, threads: _Threads, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.threads = threads
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._halt = threading.Event()
+
+    def run(self) -> None:
+        while not self._halt.wait(self.interval):
+            frames = sys._current_frames()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident in list(self.threads.idents):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    # Rooted at the thread name so pool work shows as its own tower.
+                    stack.append(names.get(ident, str(ident)))
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._halt.set()
+        self.join()
+
+
+def _write_reports(name: str, elapsed: float, profiler: cProfile.Profile, threads: _Threads,
+                   sampler: _StackSampler, allocs: List["tracemalloc.StatisticDiff"], peak: int) -> Path:
+    folder = Path(PROFILE_DIR)
+    folder.mkdir(parents=True, exist_ok=True)
+    stem = folder / f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{uuid.uuid4().hex[:6]}"
+
+    out = io.StringIO()
+    stats = threads.stats(profiler, out)
+    # .prof opens in snakeviz / pstats; .collapsed feeds flamegraph.pl or speedscope.
+    stats.dump_stats(f"{stem}.prof")
+    with open(f"{stem}.collapsed", "w", encoding="utf-8") as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+    out.write(f"{name}: {elapsed * 1000:.1f} ms wall, {len(threads.idents)} thread(s), "
+              f"{sum(sampler.stacks.values())} stack samples (cProfile times are summed over threads)\n\n")
+    stats.sort_stats("cumulative").print_stats(30)
+    with open(f"{stem}.txt", "w", encoding="utf-8") as f:
+        f.write(out.getvalue())
+
+    with open(f"{stem}.allocs.txt", "w", encoding="utf-8") as f:
+        f.write(f"peak traced memory: {peak / 1024:.1f} KiB (process-wide while {name} ran)\n\n")
+        for stat in allocs[:PROFILE_TOP_ALLOCS]:
+            f.write(f"{stat}\n")
+    return stem
+
+
+def _run_profiled(name: str, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    threads = _Threads(threading.get_ident())
+    sampler = _StackSampler(threads, PROFILE_INTERVAL)
+    profiler = cProfile.Profile()
+    sampler.start()
+    t0 = time.perf_counter()
+    try:
+        threading.setprofile(threads.hook)
+        profiler.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            threading.setprofile(None)
+    finally:
+        elapsed = time.perf_counter() - t0
+        sampler.stop()
+        allocs = tracemalloc.take_snapshot().compare_to(before, "lineno")
+        peak = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
+        try:
+            stem = _write_reports(name, elapsed, profiler, threads, sampler, allocs, peak)
+            print(f"[profiling] {name}: {elapsed * 1000:.0f} ms -> {stem}.*", file=sys.stderr)
+        except OSError as e:
+            print(f"[profiling] could not write reports for {name}: {e}", file=sys.stderr)
+
+
+def profiled(name: Optional[str] = None) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Decorator: when profiling applies to this call, run it (and every
+    thread it starts) under cProfile, a stack sampler and tracemalloc and
+    write reports to PROFILE_DIR.
+    Otherwise the cost is one flag check.
+    """
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not (_forced.get() or (PROFILE_ENABLED and random.random() < PROFILE_SAMPLE_RATE)):
+                return fn(*args, **kwargs)
+            if not _busy.acquire(blocking=False):
+                return fn(*args, **kwargs)
+            try:
+                return _run_profiled(label, fn, args, kwargs)
+            finally:
+                _busy.release()
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,196 @@
+# utils/ratelimit.py
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+# OpenRouter limits ":free" models per key (20 requests/minute at the time
+# of writing); paid models are effectively unlimited. 0 disables a limiter.
+FREE_RPM = float(os.getenv("OPENROUTER_FREE_RPM", 20))
+FREE_BURST = int(os.getenv("OPENROUTER_FREE_BURST", 3))
+PAID_RPM = float(os.getenv("OPENROUTER_RPM", 0))
+PAID_BURST = int(os.getenv("OPENROUTER_BURST", 10))
+# Longest a request will queue for a slot before giving up.
+MAX_QUEUE_WAIT = float(os.getenv("OPENROUTER_MAX_QUEUE_WAIT", 120))
+# Set to a file path to share the limits between processes on one host.
+RATE_LIMIT_DB = os.getenv("OPENROUTER_RATE_LIMIT_DB")
+
+
+class _MemoryState:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tat = 0.0
+
+    def update(self, fn: Callable[[float, float], Tuple[float, Any]]) -> Any:
+        with self._lock:
+            self._tat, result = fn(self._tat, time.time())
+            return result
+
+
+class _SqliteState:
+    """Same state in a SQLite row, updated under BEGIN IMMEDIATE so processes serialize."""
+
+    def __init__(self, path: str, name: str):
+        self.path = path
+        self.name = name
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS rate_limits (name TEXT PRIMARY KEY, tat REAL NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def update(self, fn: Callable[[float, float], Tuple[float, Any]]) -> Any:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tat FROM rate_limits WHERE name = ?", (self.name,)).fetchone()
+            tat, result = fn(row[0] if row else 0.0, time.time())
+            conn.execute("INSERT OR REPLACE INTO rate_limits (name, tat) VALUES (?, ?)", (self.name, tat))
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class RateLimiter:
+    """
+    Token bucket in its GCRA form: each caller reserves the next free slot
+    and sleeps until it. Reservations are handed out in arrival order, so
+    waiting is FIFO-fair without a queue, and the same bookkeeping works
+    for threads, asyncio tasks, and (with a SQLite file) several processes.
+
+    Retry-After and X-RateLimit-* headers push the next slot into the
+    future, so every waiter backs off together instead of storming.
+    """
+
+    def __init__(self, name: str, per_minute: float, burst: int = 1, db_path: Optional[str] = None):
+        self.name = name
+        self.enabled = per_minute > 0
+        self.interval = 60.0 / per_minute if self.enabled else 0.0
+        self.tolerance = self.interval * max(burst - 1, 0)
+        self._state = _SqliteState(db_path, name) if db_path else _MemoryState()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "waited": 0, "wait_total": 0.0, "wait_max": 0.0,
+                       "rejected": 0, "throttled_by_upstream": 0}
+
+    def reserve(self, max_wait: float = MAX_QUEUE_WAIT) -> Optional[float]:
+        """Claim a slot. Returns seconds to wait before sending, or None if over max_wait."""
+        # With no configured rate interval is 0, so only upstream penalties cause waits.
+        def claim(tat: float, now: float) -> Tuple[float, Optional[float]]:
+            tat = max(tat, now)
+            wait = max(0.0, tat - self.tolerance - now)
+            if wait > max_wait:
+                return tat, None
+            return tat + self.interval, wait
+
+        wait = self._state.update(claim)
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            if wait is None:
+                self._stats["rejected"] += 1
+            elif wait > 0:
+                self._stats["waited"] += 1
+                self._stats["wait_total"] += wait
+                self._stats["wait_max"] = max(self._stats["wait_max"], wait)
+        return wait
+
+    def acquire(self, max_wait: float = MAX_QUEUE_WAIT,
+                cancel: Optional[threading.Event] = None) -> Optional[float]:
+        """Blocking reserve(); returns the time spent queued, or None if rejected/cancelled."""
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return None
+        if wait > 0:
+            if cancel is not None:
+                if cancel.wait(wait):
+                    return None
+            else:
+                time.sleep(wait)
+        return wait
+
+    def penalize(self, seconds: float) -> None:
+        """Hold every caller back for `seconds` (e.g. from Retry-After)."""
+        if seconds <= 0:
+            return
+        self._state.update(lambda tat, now: (max(tat, now + seconds + self.tolerance), None))
+        with self._stats_lock:
+            self._stats["throttled_by_upstream"] += 1
+
+    def observe(self, headers: Mapping[str, str], status: Optional[int] = None) -> float:
+        """
+        Apply upstream rate-limit hints from a response. Returns the
+        suggested delay before the next request (0 if none).
+        """
+        delay = _retry_after(headers.get("Retry-After"))
+        remaining = headers.get("X-RateLimit-Remaining")
+        if delay is None and remaining is not None and remaining.strip() in ("0", "0.0"):
+            delay = _reset_delay(headers.get("X-RateLimit-Reset"))
+        if delay is None and status == 429:
+            delay = self.interval or 1.0
+        if delay:
+            self.penalize(delay)
+        return delay or 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            out = dict(self._stats)
+        out["wait_avg"] = round(out["wait_total"] / out["waited"], 4) if out["waited"] else 0.0
+        out["per_minute"] = round(60.0 / self.interval, 2) if self.enabled else 0
+        return out
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _reset_delay(value: Optional[str]) -> Optional[float]:
+    """X-RateLimit-Reset may be epoch milliseconds, epoch seconds, or a delta."""
+    try:
+        reset = float(value)
+    except (TypeError, ValueError):
+        return None
+    if reset > 1e12:
+        reset /= 1000.0
+    if reset > 1e9:
+        return max(0.0, reset - time.time())
+    return max(0.0, reset)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(model: str) -> RateLimiter:
+    """Shared limiter for a model's pricing tier (":free" models share one)."""
+    name = "free" if model.endswith(":free") else "paid"
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                rpm, burst = (FREE_RPM, FREE_BURST) if name == "free" else (PAID_RPM, PAID_BURST)
+                limiter = RateLimiter(name, rpm, burst, RATE_LIMIT_DB)
+                _limiters[name] = limiter
+    return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    with _limiters_lock:
+        return {name: lim.stats() for name, lim in _limiters.items()}
@@ -0,0 +1,231 @@
+# utils/relevance.py
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from utils.rules import BREED_WORDS, PET_CARE_WORDS, PET_WORDS, WEIGHT_LIMIT
+
+# Listings shorter than this are sent to the model whole.
+RELEVANCE_MIN_CHARS = int(os.getenv("RELEVANCE_MIN_CHARS", 1500))
+# Filtering has to cut at least this fraction of the listing to be worth
+# the numbered-excerpt prompt; otherwise the full listing is sent.
+RELEVANCE_MIN_REDUCTION = float(os.getenv("RELEVANCE_MIN_REDUCTION", 0.2))
+RELEVANCE_ENABLED = os.getenv("RELEVANCE_FILTER", "1") == "1"
+# Inputs with more than this much text to send are analyzed in chunks of
+# about this size (max_tokens has to fit each chunk's rewrite), each one
+# repeating up to CHUNK_OVERLAP_CHARS of the previous chunk as context.
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", 2400))
+CHUNK_OVERLAP_CHARS = int(os.getenv("CHUNK_OVERLAP_CHARS", 300))
+
+###########################################
+# SENTENCE SEGMENTER
+###########################################
+# A sentence ends at . ! or ? followed by whitespace, or at a line break
+# (listings are full of bullet lines without punctuation). "$1,200.50"
+# and "4.5 lbs" do not split.
+_BOUNDARY_RE = re.compile(r"[.!?]+(?=\s)|\n")
+
+
+def segment_sentences(text: str) -> List[Tuple[int, int]]:
+    """(start, end) offsets of each non-blank sentence, whitespace trimmed."""
+    spans: List[Tuple[int, int]] = []
+    pos = 0
+    for m in _BOUNDARY_RE.finditer(text):
+        spans.append((pos, m.end()))
+        pos = m.end()
+    spans.append((pos, len(text)))
+
+    trimmed = []
+    for start, end in spans:
+        piece = text[start:end]
+        stripped = piece.strip()
+        if stripped:
+            lead = len(piece) - len(piece.lstrip())
+            trimmed.append((start + lead, start + lead + len(stripped)))
+    return trimmed
+
+###########################################
+# RELEVANCE SCORER
+###########################################
+_TERMS = [
+    (3, re.compile(rf"\b(?:{PET_WORDS})\b", re.IGNORECASE)),
+    (2, re.compile(rf"\b(?:{BREED_WORDS}|{PET_CARE_WORDS})\b", re.IGNORECASE)),
+    (2, re.compile(rf"\b{WEIGHT_LIMIT}\b", re.IGNORECASE)),
+    (1, re.compile(r"\b(?:deposits?|fees?|non-?refundable|surcharges?)\b", re.IGNORECASE)),
+]
+# A sentence that only makes sense after the previous one ("They must be
+# under 40 lbs.") follows it into the excerpt.
+_CONTINUATION_RE = re.compile(
+    r"^(?:they|them|it|its|these|those|this|such|each|both|either|max(?:imum)?|limit|"
+    r"must|only|up\s+to|additional|also)\b",
+    re.IGNORECASE,
+)
+
+
+def score_sentence(sentence: str) -> int:
+    """Sum of term weights: pets/animals 3, breeds/weights 2, deposits/fees 1."""
+    return sum(weight for weight, pattern in _TERMS if pattern.search(sentence))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for reporting savings."""
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+
+@lru_cache(maxsize=256)
+def extract(text: str) -> Dict[str, Any]:
+    """
+    Pick the pet-relevant passages of a listing.
+
+    Returns {"filtered", "segments", "original_tokens", "sent_tokens",
+    "reduction"}. Each segment is {"id", "start", "end", "text", "score"};
+    start/end are offsets into `text`, and adjacent relevant sentences are
+    merged into one segment. "filtered" is False when the whole listing
+    should be sent (short input, nothing relevant, or too little saved).
+    Cached per text; treat the result as read-only.
+    """
+    text = text or ""
+    original_tokens = estimate_tokens(text)
+    whole = {"filtered": False, "segments": [], "original_tokens": original_tokens,
+             "sent_tokens": original_tokens, "reduction": 0.0}
+    if not RELEVANCE_ENABLED or len(text) < RELEVANCE_MIN_CHARS:
+        return whole
+
+    picked: List[List[int]] = []
+    previous_kept = False
+    for start, end in segment_sentences(text):
+        sentence = text[start:end]
+        score = score_sentence(sentence)
+        keep = score > 0 or (previous_kept and bool(_CONTINUATION_RE.match(sentence)))
+        if keep:
+            # Merge with the previous segment when only whitespace separates them.
+            if picked and not text[picked[-1][1]:start].strip():
+                picked[-1][1] = end
+                picked[-1][2] += score
+            else:
+                picked.append([start, end, score])
+        previous_kept = keep
+
+    segments = [{"id": i, "start": s, "end": e, "text": text[s:e], "score": score}
+                for i, (s, e, score) in enumerate(picked, 1)]
+    sent_tokens = sum(estimate_tokens(seg["text"]) for seg in segments)
+    reduction = 1 - sent_tokens / original_tokens
+    if not segments or reduction < RELEVANCE_MIN_REDUCTION:
+        return whole
+    return {"filtered": True, "segments": segments, "original_tokens": original_tokens,
+            "sent_tokens": sent_tokens, "reduction": round(reduction, 3)}
+
+
+def _units(text: str) -> List[Tuple[int, int]]:
+    """Sentence spans the model would be sent: the relevant ones, or all of them."""
+    excerpt = extract(text)
+    sentences = segment_sentences(text)
+    if not excerpt["filtered"]:
+        return sentences
+    inside = [(seg["start"], seg["end"]) for seg in excerpt["segments"]]
+    return [(s, e) for s, e in sentences if any(a <= s and e <= b for a, b in inside)]
+
+
+def _chunk_excerpt(text: str, units: List[Tuple[int, int]], owned_from: int, index: int) -> Dict[str, Any]:
+    segments: List[Dict[str, Any]] = []
+    for start, end in units:
+        owned = start >= owned_from
+        last = segments[-1] if segments else None
+        if last and last["owned"] == owned and not text[last["end"]:start].strip():
+            last["end"] = end
+        else:
+            segments.append({"id": len(segments) + 1, "start": start, "end": end, "owned": owned})
+    for seg in segments:
+        seg["text"] = text[seg["start"]:seg["end"]]
+    sent_tokens = sum(estimate_tokens(seg["text"]) for seg in segments)
+    return {"filtered": True, "chunk": index, "segments": segments,
+            "original_tokens": estimate_tokens(text), "sent_tokens": sent_tokens,
+            "reduction": round(1 - sent_tokens / max(1, estimate_tokens(text)), 3)}
+
+
+@lru_cache(maxsize=64)
+def chunk_excerpts(text: str, max_chars: int = CHUNK_MAX_CHARS,
+                   overlap_chars: int = CHUNK_OVERLAP_CHARS) -> List[Dict[str, Any]]:
+    """
+    Split what would be sent for `text` into excerpts of about max_chars.
+
+    Returns [] when it fits in one request. Otherwise each excerpt is
+    shaped like extract()'s, plus "chunk" (its index); its segments also
+    carry "owned": False for the leading sentences repeated from the
+    previous chunk as context, whose rewrites that chunk already owns.
+    Sentences are never split, so a single huge sentence is its own chunk.
+    """
+    units = _units(text or "")
+    if sum(e - s for s, e in units) <= max_chars:
+        return []
+
+    chunks: List[Dict[str, Any]] = []
+    i = 0
+    while i < len(units):
+        # Back up over the previous chunk's last sentences for context.
+        j, overlap = i, 0
+        while chunks and j > 0 and overlap + units[j - 1][1] - units[j - 1][0] <= overlap_chars:
+            j -= 1
+            overlap += units[j][1] - units[j][0]
+        size, k = overlap, i
+        while k < len(units) and (k == i or size + units[k][1] - units[k][0] <= max_chars):
+            size += units[k][1] - units[k][0]
+            k += 1
+        chunks.append(_chunk_excerpt(text, units[j:k], units[i][0], len(chunks)))
+        i = k
+    return chunks
+
+
+def numbered(excerpt: Dict[str, Any]) -> str:
+    """Prompt form of the excerpt: one "[n] text" block per segment."""
+    return "\n".join(f"[{seg['id']}] {seg['text']}" for seg in excerpt["segments"])
+
+
+def rewrites(excerpt: Dict[str, Any], fixed_segments: Any) -> List[List[Any]]:
+    """
+    [start, end, rewrite] for each segment the model rewrote; fixed_segments
+    is keyed by segment number, as a dict or a list in segment order.
+    """
+    if isinstance(fixed_segments, list):
+        fixed_segments = {str(i): v for i, v in enumerate(fixed_segments, 1)}
+    if not isinstance(fixed_segments, dict):
+        return []
+    edits = []
+    for seg in excerpt["segments"]:
+        rewrite = fixed_segments.get(str(seg["id"]))
+        if isinstance(rewrite, str):
+            edits.append([seg["start"], seg["end"], rewrite.strip()])
+    return edits
+
+
+def apply(text: str, edits: List[List[Any]]) -> str:
+    """Replace each non-overlapping [start, end, rewrite] span of the original."""
+    out = text
+    for start, end, rewrite in sorted(edits, key=lambda e: -e[0]):
+        out = out[:start] + rewrite + out[end:]
+    return out
+
+
+def locate(phrases: List[Any], text: str) -> List[Dict[str, Any]]:
+    """Offsets in `text` of each phrase found there (case- and whitespace-insensitive)."""
+    found = []
+    for phrase in phrases:
+        if not isinstance(phrase, str) or not phrase.strip():
+            continue
+        pattern = r"\s+".join(re.escape(word) for word in phrase.split())
+        m = re.search(pattern, text, re.IGNORECASE)
+        if m:
+            found.append({"phrase": phrase, "start": m.start(), "end": m.end()})
+    return found
+
+
+def summary(excerpt: Dict[str, Any]) -> Dict[str, Any]:
+    """What goes into a result's _meta: the savings and which spans were sent."""
+    return {
+        "filtered": excerpt["filtered"],
+        "original_tokens": excerpt["original_tokens"],
+        "sent_tokens": excerpt["sent_tokens"],
+        "reduction": excerpt["reduction"],
+        "spans": [[seg["start"], seg["end"]] for seg in excerpt["segments"]],
+    }
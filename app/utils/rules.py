@@ -0,0 +1,174 @@
+# utils/rules.py
+import re
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+###########################################
+# LISTING-SIDE MATCHER
+###########################################
+# One alternation, one finditer pass per listing. Each branch is a named
+# group so the match tells us which rule kind fired.
+#
+# The word lists are shared with utils.relevance, so "is this listing about
+# pets at all?" and the sentence scorer cannot drift apart.
+PET_WORDS = (
+    r"pets?|dogs?|cats?|pupp(?:y|ies)|kittens?|animals?|canines?|felines?|birds?|"
+    r"reptiles?|hamsters?|rabbits?|fish|esa|emotional\s+support|service\s+animals?|"
+    r"assistance\s+animals?|companion\s+animals?"
+)
+BREED_WORDS = (
+    r"breeds?|pit\s?bulls?|pitbulls?|rottweilers?|dobermans?|german\s+shepherds?|"
+    r"huskies|husky|akitas?|chows?|mastiffs?|staffordshire|bull\s?dogs?"
+)
+PET_CARE_WORDS = r"leash(?:ed)?|litter|vaccinat\w*|spay\w*|neuter\w*"
+WEIGHT_LIMIT = r"\d{1,3}\s*(?:lbs?|pounds?|kgs?)"
+
+_LISTING_PATTERNS = [
+    ("service_fee",
+     r"(?:service|support|assistance|emotional\s+support)\s+animals?[^.\n]{0,60}?\b(?:deposit|fee|rent)s?\b"),
+    ("breed",
+     r"\b(?:no|not\s+allowed|prohibited|restricted|banned|excluded)\b[^.\n]{0,40}?\b(?:" + BREED_WORDS + r")\b"
+     r"|\b(?:aggressive|dangerous|restricted)\s+breeds?\b"),
+    ("weight",
+     r"\b(?:no|max(?:imum)?|under|up\s+to|limit|over|less\s+than)\b[^.\n$]{0,30}?"
+     r"(?P<weight_value>\d{1,3})\s*(?:lbs?|pounds?|kgs?)\b"),
+    ("fee",
+     r"\$\s?(?P<fee_value>\d[\d,]*(?:\.\d{2})?)\s*(?:non-?refundable\s+)?(?:pet|animal|dog|cat)\s+(?:deposit|fee|rent)s?\b"
+     r"|\b(?:pet|animal|dog|cat)\s+(?:deposit|fee|rent)s?\b[^.\n$]{0,30}?\$\s?(?P<fee_value2>\d[\d,]*(?:\.\d{2})?)"),
+    ("blanket_ban",
+     r"\bno\s+pets\b|\bpets?\s+(?:are\s+)?(?:not\s+(?:allowed|permitted|accepted)|prohibited)\b"
+     r"|\bstrictly\s+no\s+(?:pets|animals)\b|\bno\s+animals\b"),
+]
+_LISTING_RE = re.compile(
+    "|".join(f"(?P<{kind}>{pattern})" for kind, pattern in _LISTING_PATTERNS),
+    re.IGNORECASE,
+)
+
+_PET_RE = re.compile(
+    rf"\b(?:{PET_WORDS}|{BREED_WORDS}|{PET_CARE_WORDS}|{WEIGHT_LIMIT})\b",
+    re.IGNORECASE,
+)
+
+###########################################
+# ORDINANCE-SIDE COMPILER
+###########################################
+_SENTENCE_RE = re.compile(r"[^.!?]+[.!?]?")
+_NEGATION_RE = re.compile(
+    r"\b(?:unlawful|illegal|must\s+not|may\s+not|shall\s+not|cannot|prohibited|not\s+be|"
+    r"must\s+allow)\b",
+    re.IGNORECASE,
+)
+_CAP_RE = re.compile(
+    r"\b(?:fees?|deposits?|rent)\b[^.]{0,60}?\b(?:must|may|shall|can)\s*not\s+exceed\s+\$\s?(\d[\d,]*)",
+    re.IGNORECASE,
+)
+_SERVICE_RE = re.compile(r"\b(?:service|support|assistance)\s+animals?\b", re.IGNORECASE)
+_MONEY_WORD_RE = re.compile(r"\b(?:deposits?|fees?)\b", re.IGNORECASE)
+_BLANKET_RE = re.compile(r"\b(?:blanket\s+bans?|ban\s+on\s+all\s+pets|must\s+allow\s+pets)\b", re.IGNORECASE)
+
+_REASONS = {
+    "service_fee": "Charging deposits or fees for service/support animals is restricted here.",
+    "breed": "Breed-based restrictions are limited by this jurisdiction.",
+    "weight": "Weight-based restrictions are limited by this jurisdiction.",
+    "fee": "Pet fee/deposit of ${amount:,.0f} exceeds the ${cap:,.0f} cap.",
+    "blanket_ban": "Blanket pet bans are not allowed in this jurisdiction.",
+}
+
+
+def _money(text: Optional[str]) -> Optional[float]:
+    if not text:
+        return None
+    try:
+        return float(text.replace(",", ""))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=256)
+def compile_rules(ordinance: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Extract mechanical rules from an ordinance, keyed by rule kind.
+
+    Each rule carries the ordinance sentence it came from (used as the
+    citation) and, for fee caps, the numeric threshold. Cached per text.
+    """
+    rules: Dict[str, Dict[str, Any]] = {}
+    for m in _SENTENCE_RE.finditer(ordinance or ""):
+        sentence = m.group(0).strip()
+        if not sentence:
+            continue
+
+        cap = _CAP_RE.search(sentence)
+        if cap:
+            rules.setdefault("fee", {"citation": sentence, "cap": _money(cap.group(1))})
+
+        if not _NEGATION_RE.search(sentence):
+            continue
+        service_only = bool(_SERVICE_RE.search(sentence))
+        lowered = sentence.lower()
+
+        if service_only and _MONEY_WORD_RE.search(sentence):
+            rules.setdefault("service_fee", {"citation": sentence})
+        if "breed" in lowered:
+            rules.setdefault("breed", {"citation": sentence, "service_only": service_only})
+        if "weight" in lowered:
+            rules.setdefault("weight", {"citation": sentence, "service_only": service_only})
+        if _BLANKET_RE.search(sentence):
+            rules.setdefault("blanket_ban", {"citation": sentence})
+    return rules
+
+
+def _match_kind(m: "re.Match") -> Tuple[str, Optional[float]]:
+    # The outer kind group closes last, so lastgroup is the rule kind.
+    kind = m.lastgroup
+    if kind == "weight":
+        return kind, _money(m.group("weight_value"))
+    if kind == "fee":
+        return kind, _money(m.group("fee_value") or m.group("fee_value2"))
+    return kind, None
+
+
+def prescan(listing: str, ordinance: str) -> Dict[str, Any]:
+    """
+    Instant, deterministic pass over a listing before the LLM call.
+
+    Returns {"pet_related", "findings", "elapsed_ms"}; each finding has
+    rule, phrase, start, end, reason and citation. Findings are
+    preliminary: only the rules that could be compiled from the ordinance
+    text are checked.
+    """
+    t0 = time.perf_counter()
+    listing = listing or ""
+    rules = compile_rules(ordinance or "")
+    findings: List[Dict[str, Any]] = []
+    matched = False
+
+    for m in _LISTING_RE.finditer(listing):
+        matched = True
+        kind, value = _match_kind(m)
+        rule = rules.get(kind)
+        if not rule:
+            continue
+        reason = _REASONS[kind]
+        if kind == "fee":
+            if rule.get("cap") is None or value is None or value <= rule["cap"]:
+                continue
+            reason = reason.format(amount=value, cap=rule["cap"])
+        elif rule.get("service_only"):
+            reason += " (applies to service/support animals)"
+        findings.append({
+            "rule": kind,
+            "phrase": m.group(0).strip(),
+            "start": m.start(),
+            "end": m.end(),
+            "reason": reason,
+            "citation": rule["citation"],
+        })
+
+    return {
+        # Any listing-side match counts, even one this ordinance has no rule for.
+        "pet_related": matched or bool(_PET_RE.search(listing)),
+        "findings": findings,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 3),
+    }
@@ -0,0 +1,103 @@
+# utils/stream.py
+import json
+from typing import Any, List, Optional
+
+
+class RiskyPhraseStream:
+    """
+    Incremental scanner over a streamed JSON answer.
+
+    feed() takes raw text deltas as they arrive and returns every
+    `risky_phrases` entry that became complete in that delta, so the UI
+    can show warnings long before `fixed_listing` has finished generating.
+    Anything before the first "{" (code fences, chatter) is ignored.
+    The scanner never backtracks: each character is looked at once.
+    """
+
+    def __init__(self, key: str = "risky_phrases"):
+        self.key = key
+        self._buf: List[str] = []     # text of the element being collected
+        self._stack: List[str] = []   # "{" / "[" containers, outermost first
+        self._in_string = False
+        self._escape = False
+        self._string: List[str] = []  # current string contents (keys only)
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+        self._target_depth: Optional[int] = None  # depth of the risky_phrases array
+        self._collecting = False
+        self._started = False
+        self._finished = False
+        self.emitted = 0
+
+    def _emit(self, out: List[Any]) -> None:
+        text = "".join(self._buf).strip()
+        self._buf = []
+        self._collecting = False
+        if not text:
+            return
+        try:
+            out.append(json.loads(text))
+            self.emitted += 1
+        except ValueError:
+            pass
+
+    def feed(self, chunk: str) -> List[Any]:
+        out: List[Any] = []
+        for ch in chunk:
+            if self._finished:
+                break
+            if not self._started:
+                if ch != "{":
+                    continue
+                self._started = True
+
+            depth = len(self._stack)
+            in_target = self._target_depth is not None and depth == self._target_depth
+
+            if self._collecting:
+                self._buf.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = "".join(self._string)
+                    self._string = []
+                    if self._collecting and in_target:
+                        self._emit(out)
+                    continue
+                if not self._collecting and depth == 1:
+                    self._string.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if in_target and not self._collecting:
+                    self._collecting = True
+                    self._buf = [ch]
+            elif ch in "{[":
+                if in_target and not self._collecting:
+                    self._collecting = True
+                    self._buf = [ch]
+                if (ch == "[" and depth == 1 and self._stack[0] == "{"
+                        and self._current_key == self.key):
+                    self._target_depth = 2
+                self._stack.append(ch)
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if not self._stack:
+                    self._finished = True
+                if self._target_depth is not None and len(self._stack) < self._target_depth:
+                    self._target_depth = None  # risky_phrases array closed
+                elif self._collecting and len(self._stack) == self._target_depth:
+                    self._emit(out)
+            elif ch == ":" and depth == 1:
+                self._current_key = self._last_string
+            elif ch == "," and depth == 1:
+                self._current_key = None
+        return out